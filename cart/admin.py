@@ -1,5 +1,5 @@
 from django.contrib import admin
-from cart.models import Coupon, Cart, Wishlist
+from cart.models import Coupon, Cart, CartSummary, Wishlist
 
 # =========================================================
 # COUPON ADMIN
@@ -17,10 +17,27 @@ class CouponAdmin(admin.ModelAdmin):
 # =========================================================
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'product', 'variant', 'quantity', 'unit_price', 'subtotal', 'discount_amount', 'total_price', 'paid', 'created_at', 'updated_at')
+    # discounts are priced per cart (cart.pricing), not per row
+    list_display = ('id', 'user', 'product', 'variant', 'quantity', 'stored_unit_price', 'subtotal', 'coupon', 'paid', 'created_at', 'updated_at')
     list_filter = ('paid',)
+    list_select_related = ('user', 'product', 'variant', 'coupon')
     search_fields = ('user__username', 'product__title', 'variant__id')
-    readonly_fields = ('unit_price', 'subtotal', 'discount_amount', 'total_price', 'created_at', 'updated_at')
+    readonly_fields = ('unit_price', 'subtotal', 'created_at', 'updated_at')
+
+
+# =========================================================
+# CART SUMMARY ADMIN
+# =========================================================
+@admin.register(CartSummary)
+class CartSummaryAdmin(admin.ModelAdmin):
+    # maintained by the Cart signals; `manage.py rebuild_cart_summaries` repairs drift
+    list_display = ('user', 'item_count', 'line_count', 'total', 'version', 'updated_at')
+    search_fields = ('user__username',)
+    list_select_related = ('user',)
+    readonly_fields = ('user', 'item_count', 'line_count', 'total', 'version', 'updated_at')
+
+    def has_add_permission(self, request):
+        return False
 
 
 # =========================================================
@@ -1,10 +1,23 @@
-from cart.models import Cart
+from cart.models import Cart, get_cart_summary
+from store.utilities import lazy_context
+
+
+def build_cart_items(user):
+    # the mini cart shows the first three lines
+    cart_items = list(Cart.objects.filter(user=user, paid=False).select_related('product', 'variant', 'variant__gallery_image', 'variant__color', 'variant__size')[:3])
+    return {'cart_items': cart_items}
+
+
+def build_cart_summary(user):
+    # badge and totals come from the denormalized summary, one primary key lookup
+    summary = get_cart_summary(user.pk)
+    return {'cart_count': summary.item_count, 'total_price': summary.total}
 
 
 def cart_context(request):
     if request.user.is_authenticated:
-        cart_items = Cart.objects.filter(user=request.user, paid=False).select_related('product','variant')[:3]
-        cart_count = cart_items.count()
-        total_price = sum([item.subtotal for item in cart_items])
-        return {'cart_items': cart_items, 'total_price': total_price, 'cart_count': cart_count}
-    return {'cart_items': [], 'cart_count': 0, 'total_price': 0}
\ No newline at end of file
+        return {
+            **lazy_context(request, 'cart_summary', lambda: build_cart_summary(request.user), ('cart_count', 'total_price')),
+            **lazy_context(request, 'cart_items', lambda: build_cart_items(request.user), ('cart_items',)),
+        }
+    return {'cart_items': [], 'cart_count': 0, 'total_price': 0}
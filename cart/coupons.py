@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from store.cache import get_version
+from store.metrics import record_cache
+from cart.models import Coupon, COUPON_VERSION_KEY
+
+# =========================================================
+# COUPON CACHE
+# =========================================================
+# During a promotion thousands of users paste the same few codes. Each
+# process keeps the codes it has looked up, valid or not, in a small LRU:
+# an entry lasts COUPON_CACHE_TIMEOUT seconds at most and never past the
+# coupon's expiry_date, and the whole cache is dropped when a Coupon is
+# saved or deleted anywhere (COUPON_VERSION_KEY, bumped in cart.models).
+COUPON_CACHE_SIZE = getattr(settings, 'COUPON_CACHE_SIZE', 1024)
+COUPON_CACHE_TIMEOUT = getattr(settings, 'COUPON_CACHE_TIMEOUT', 60)
+
+
+def normalize_code(code):
+    return (code or '').strip().upper()
+
+
+class CouponCache:
+    def __init__(self, size=COUPON_CACHE_SIZE, timeout=COUPON_CACHE_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.version = None
+        # normalized code -> (Coupon or None, expires at)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, code, now=None):
+        # the active, unexpired coupon for ``code``, or None
+        code = normalize_code(code)
+        if not code:
+            return None
+        now = now or timezone.now()
+        version = get_version(COUPON_VERSION_KEY)
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+            entry = self.entries.get(code)
+            if entry is not None and entry[1] > now:
+                self.entries.move_to_end(code)
+                record_cache('coupon', True)
+                return entry[0]
+        record_cache('coupon', False)
+
+        coupon = Coupon.objects.filter(
+            Q(expiry_date__isnull=True) | Q(expiry_date__gt=now), code__iexact=code, active=True
+        ).first()
+        expires = now + timedelta(seconds=self.timeout)
+        if coupon is not None and coupon.expiry_date:
+            expires = min(expires, coupon.expiry_date)
+        with self.lock:
+            # a Coupon changed while we were reading: keep the answer out
+            if version == self.version:
+                self.entries[code] = (coupon, expires)
+                self.entries.move_to_end(code)
+                while len(self.entries) > self.size:
+                    self.entries.popitem(last=False)
+        return coupon
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.version = None
+
+
+coupon_cache = CouponCache()
+
+
+def resolve_coupon(code, now=None):
+    return coupon_cache.get(code, now)
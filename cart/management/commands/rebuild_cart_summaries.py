@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from cart.models import rebuild_cart_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute CartSummary rows (item count, line count, total) from open cart lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Only rebuild this user id (repeatable)")
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_cart_summaries(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Cart summaries rebuilt for {rebuilt} user(s)."))
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:08
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum, F
+
+
+def backfill_summaries(apps, schema_editor):
+    Cart = apps.get_model('cart', 'Cart')
+    CartSummary = apps.get_model('cart', 'CartSummary')
+    rows = Cart.objects.filter(paid=False).values('user_id').annotate(
+        items=Sum('quantity'), lines=Count('id'),
+        total=Sum(F('quantity') * F('stored_unit_price'),
+                  output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+    ).order_by()
+    CartSummary.objects.bulk_create([
+        CartSummary(user_id=row['user_id'], item_count=row['items'], line_count=row['lines'],
+                    total=Decimal(row['total'] or 0).quantize(Decimal('0.01')), version=1)
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='cart_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('item_count', models.IntegerField(default=0)),
+                ('line_count', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Cart Summaries',
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:13
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum, F
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    # one open line per (user, product, variant): fold duplicates into the
+    # oldest line, priced like the newest one (what a merge in AddToCartView
+    # does), then recount the summaries of the users involved
+    Cart = apps.get_model('cart', 'Cart')
+    CartSummary = apps.get_model('cart', 'CartSummary')
+    duplicates = Cart.objects.filter(paid=False).values('user_id', 'product_id', 'variant_id') \
+        .annotate(lines=Count('id')).filter(lines__gt=1).order_by()
+
+    users = set()
+    for group in duplicates:
+        del group['lines']
+        lines = list(Cart.objects.filter(paid=False, **group).order_by('id'))
+        keep = lines[0]
+        keep.quantity = sum(line.quantity for line in lines)
+        keep.stored_unit_price = max(lines, key=lambda line: (line.updated_at, line.id)).stored_unit_price
+        keep.save(update_fields=['quantity', 'stored_unit_price'])
+        Cart.objects.filter(id__in=[line.id for line in lines[1:]]).delete()
+        users.add(group['user_id'])
+
+    totals = Cart.objects.filter(paid=False, user_id__in=users).values('user_id').annotate(
+        items=Sum('quantity'), lines=Count('id'),
+        total=Sum(F('quantity') * F('stored_unit_price'),
+                  output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+    ).order_by()
+    for row in totals:
+        CartSummary.objects.update_or_create(user_id=row['user_id'], defaults={
+            'item_count': row['items'], 'line_count': row['lines'],
+            'total': Decimal(row['total'] or 0).quantize(Decimal('0.01')),
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_cart_summary'),
+        ('store', '0008_product_external_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['user', 'paid'], name='cart_user_paid_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(models.F('user'), models.F('product'), django.db.models.functions.comparison.Coalesce(models.F('variant'), models.Value(0)), condition=models.Q(('paid', False)), name='unique_open_cart_line'),
+        ),
+    ]
@@ -1,12 +1,23 @@
-from django.db import models
+from django.core.cache import cache
+from dataclasses import dataclass
+from django.db import connection, models, transaction
+from django.db.models import Count, Sum, F, Q, Value, DecimalField
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from store.models import Product, ProductVariant
+from store.cache import get_or_build, bump_version
+from store.models import Product, ProductVariant, LoadedRelationsValidationMixin
 from decimal import Decimal, ROUND_HALF_UP
 
 User = get_user_model()
 
+CART_SUMMARY_TIMEOUT = 60 * 5
+# bumped on every Coupon change; the process-wide coupon caches follow it
+COUPON_VERSION_KEY = 'coupons:version'
+
 
 # ------------------------------
 # Coupon Model
@@ -36,9 +47,12 @@ class Coupon(models.Model):
 
     @property
     def is_valid(self) -> bool:
+        return self.is_valid_at(timezone.now())
+
+    def is_valid_at(self, now) -> bool:
         if not self.active:
             return False
-        if self.expiry_date and self.expiry_date < timezone.now():
+        if self.expiry_date and self.expiry_date < now:
             return False
         return True
 
@@ -49,7 +63,7 @@ class Coupon(models.Model):
 # ------------------------------
 # Cart Model
 # ------------------------------
-class Cart(models.Model):
+class Cart(LoadedRelationsValidationMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     variant = models.ForeignKey(ProductVariant, on_delete=models.SET_NULL, null=True, blank=True)
@@ -66,6 +80,36 @@ class Cart(models.Model):
     class Meta:
         ordering = ['id']
         verbose_name_plural = 'Carts'
+        constraints = [
+            # one open line per product/variant; COALESCE because NULL
+            # variants never conflict in a unique index
+            models.UniqueConstraint(
+                F('user'), F('product'), Coalesce(F('variant'), Value(0)),
+                condition=Q(paid=False), name='unique_open_cart_line'
+            ),
+        ]
+        indexes = [
+            # every cart view and the context processor filter on these
+            models.Index(fields=['user', 'paid'], name='cart_user_paid_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_summary_state()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._remember_summary_state()
+
+    def _remember_summary_state(self):
+        # what this line currently contributes to its owner's CartSummary
+        deferred = self.get_deferred_fields()
+        if deferred & {'user_id', 'quantity', 'stored_unit_price', 'paid'}:
+            self._summary_state = None
+        else:
+            self._summary_state = (self.user_id, self.paid, self.quantity, self.subtotal)
 
     # Dynamic latest price (display only)
     @property
@@ -74,27 +118,12 @@ class Cart(models.Model):
             return self.variant.variant_price
         return self.product.sale_price
 
-    # Subtotal using stored_unit_price
+    # Subtotal using stored_unit_price; discounts and totals are
+    # cart-level, see cart.pricing
     @property
     def subtotal(self) -> Decimal:
         return (self.stored_unit_price * self.quantity).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
-    # Discount amount
-    @property
-    def discount_amount(self) -> Decimal:
-        if self.coupon and self.coupon.is_valid and self.subtotal >= self.coupon.min_purchase:
-            if self.coupon.discount_type == 'percent':
-                return (self.subtotal * self.coupon.discount_value / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            elif self.coupon.discount_type == 'fixed':
-                return min(self.subtotal, self.coupon.discount_value)
-        return Decimal('0.00')
-
-    # Total after discount
-    @property
-    def total_price(self) -> Decimal:
-        total = self.subtotal - self.discount_amount
-        return total if total >= Decimal('0.00') else Decimal('0.00')
-
     # Stock validation
     def clean(self):
         if self.variant:
@@ -113,7 +142,9 @@ class Cart(models.Model):
         # Set stored_unit_price only when creating new item
         if not self.pk:
             self.stored_unit_price = self.unit_price
-        self.full_clean()
+        # only a new line can collide with unique_open_cart_line on a normal
+        # save; the lookup query is skipped for quantity changes
+        self.full_clean(validate_constraints=self._state.adding)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -139,3 +170,317 @@ class Wishlist(models.Model):
     def __str__(self):
         variant_str = f" - {self.variant}" if self.variant else ""
         return f"{self.user.username} - {self.product.title}{variant_str}"
+
+
+# ------------------------------
+# Cart Summary Model
+# ------------------------------
+class CartSummary(models.Model):
+    # Denormalized totals of a user's open (unpaid) cart lines, kept in step
+    # by the Cart signals below so the header badge is one primary key lookup
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='cart_summary')
+    item_count = models.IntegerField(default=0)
+    line_count = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    # bumped by every change, for clients that cache the badge
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Cart Summaries'
+
+    def as_json(self):
+        return {
+            'cart_count': self.item_count,
+            'line_count': self.line_count,
+            'total_price': str(self.total),
+            'cart_version': self.version,
+        }
+
+    def __str__(self):
+        return f"{self.user_id}: {self.item_count} item(s), {self.total}"
+
+
+# ------------------------------
+# Cart Summary Maintenance
+# ------------------------------
+def rebuild_cart_summaries(user_ids=None):
+    # Recompute from the cart lines; users without open lines get zeros
+    lines = Cart.objects.filter(paid=False)
+    summaries = CartSummary.objects.all()
+    if user_ids is not None:
+        lines = lines.filter(user_id__in=user_ids)
+        summaries = summaries.filter(user_id__in=user_ids)
+
+    totals = {
+        row['user_id']: row
+        for row in lines.values('user_id').annotate(
+            items=Sum('quantity'), lines=Count('id'),
+            total=Sum(F('quantity') * F('stored_unit_price'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+        ).order_by()
+    }
+    versions = dict(summaries.values_list('user_id', 'version'))
+    rows = [
+        CartSummary(
+            user_id=user_id,
+            item_count=totals.get(user_id, {}).get('items') or 0,
+            line_count=totals.get(user_id, {}).get('lines') or 0,
+            total=Decimal(totals.get(user_id, {}).get('total') or 0).quantize(Decimal('0.01')),
+            version=versions.get(user_id, 0) + 1,
+            updated_at=timezone.now(),
+        )
+        for user_id in sorted(set(totals) | set(versions) | set(user_ids or ()))
+    ]
+    invalidate_cart_summaries([row.user_id for row in rows])
+    CartSummary.objects.bulk_create(
+        rows, batch_size=500, update_conflicts=True, unique_fields=['user'],
+        update_fields=['item_count', 'line_count', 'total', 'version', 'updated_at'],
+    )
+    return len(rows)
+
+
+def cart_summary_key(user_id):
+    return f'cart_summary:{user_id}'
+
+
+def invalidate_cart_summaries(user_ids):
+    keys = [cart_summary_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def load_cart_summary(user_id):
+    # straight from the database: sees changes made in the current transaction
+    summary = CartSummary.objects.filter(user_id=user_id).first()
+    if summary is None:
+        # first visit since the table was introduced or rows were bulk loaded
+        rebuild_cart_summaries([user_id])
+        summary = CartSummary.objects.get(user_id=user_id)
+    return summary
+
+
+def get_cart_summary(user_id):
+    # cached for page renders; dropped whenever the summary row changes
+    return get_or_build(cart_summary_key(user_id), lambda: load_cart_summary(user_id), CART_SUMMARY_TIMEOUT)
+
+
+def apply_cart_delta(user_id, items, lines, total, create=True):
+    # single UPDATE inside the caller's transaction, safe against concurrent
+    # changes to the same cart
+    updated = CartSummary.objects.filter(user_id=user_id).update(
+        item_count=F('item_count') + items,
+        line_count=F('line_count') + lines,
+        total=F('total') + total,
+        version=F('version') + 1,
+        updated_at=timezone.now(),
+    )
+    if updated:
+        invalidate_cart_summaries([user_id])
+    elif create:
+        # no summary yet: count the lines, this change included
+        rebuild_cart_summaries([user_id])
+
+
+def _summary_contribution(paid, quantity, subtotal):
+    return (0, 0, Decimal('0.00')) if paid else (quantity, 1, subtotal)
+
+
+# ------------------------------
+# Atomic Quantity Changes
+# ------------------------------
+@dataclass(frozen=True)
+class LineQuantity:
+    id: int
+    quantity: int
+    unit_price: Decimal
+    coupon_id: int = None
+
+    @property
+    def subtotal(self) -> Decimal:
+        return (self.unit_price * self.quantity).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def _can_return_from_update():
+    # UPDATE ... RETURNING: PostgreSQL and SQLite 3.35+, not MySQL/MariaDB
+    return connection.vendor in ('postgresql', 'sqlite') and connection.features.can_return_columns_from_insert
+
+
+def _line_stock_sql(cart):
+    # the stock limit is read in the same statement, so it cannot be stale
+    product = connection.ops.quote_name(Product._meta.db_table)
+    variant = connection.ops.quote_name(ProductVariant._meta.db_table)
+    return (
+        f"CASE WHEN {cart}.variant_id IS NULL "
+        f"THEN (SELECT available_stock FROM {product} WHERE {product}.id = {cart}.product_id) "
+        f"ELSE (SELECT available_stock FROM {variant} WHERE {variant}.id = {cart}.variant_id) END"
+    )
+
+
+def _update_line_quantity(user_id, delta, unit_price, same_price, lookup):
+    cart = connection.ops.quote_name(Cart._meta.db_table)
+    stock = _line_stock_sql(cart)
+    now = Cart._meta.get_field('updated_at').get_db_prep_save(timezone.now(), connection)
+    price_field = Cart._meta.get_field('stored_unit_price')
+
+    assignments, params = ["quantity = quantity + %s", "updated_at = %s"], [delta, now]
+    where = ["user_id = %s", "paid = %s", "quantity + %s >= 1"]
+    where_params = [user_id, False, delta]
+    if delta > 0:
+        # only growing a line is bounded by the stock: a line above a stock
+        # that dropped since must still be reducible
+        where.append(f"quantity + %s <= {stock}")
+        where_params.append(delta)
+    if unit_price is not None:
+        price = price_field.get_db_prep_save(unit_price, connection)
+        if same_price:
+            where.append("stored_unit_price = %s")
+            where_params.append(price)
+        else:
+            assignments.append("stored_unit_price = %s")
+            params.append(price)
+    for column, value in lookup.items():
+        if value is None:
+            where.append(f"{column} IS NULL")
+        else:
+            where.append(f"{column} = %s")
+            where_params.append(value)
+
+    sql = f"UPDATE {cart} SET {', '.join(assignments)} WHERE {' AND '.join(where)}"
+    with connection.cursor() as cursor:
+        if _can_return_from_update():
+            cursor.execute(f"{sql} RETURNING id, quantity, stored_unit_price, coupon_id", params + where_params)
+            row = cursor.fetchone()
+        else:
+            cursor.execute(sql, params + where_params)
+            row = None
+            if cursor.rowcount:
+                row = Cart.objects.filter(user_id=user_id, paid=False, **lookup) \
+                    .values_list('id', 'quantity', 'stored_unit_price', 'coupon_id').first()
+    if row is None:
+        return None
+    line_id, quantity, price, coupon_id = row
+    return LineQuantity(line_id, quantity, price_field.to_python(price).quantize(Decimal('0.01')), coupon_id)
+
+
+def change_line_quantity(user_id, delta, unit_price=None, **lookup):
+    """
+    Add ``delta`` to the quantity of the user's open cart line matching
+    ``lookup`` (``id=`` or ``product_id=`` and ``variant_id=``) with a
+    single conditional UPDATE: the row only changes while the new quantity
+    stays at least 1 and, when growing, within the stock of the line's
+    variant (or product), so
+    concurrent requests cannot lose an update or oversell, with or without
+    row locks. Returns the new LineQuantity, or None when nothing matched.
+
+    With ``unit_price`` the line is repriced too. The summary delta is
+    applied here, as the UPDATE bypasses the model signals.
+    """
+    # one transaction with the summary delta; no savepoint when nested
+    with transaction.atomic(savepoint=False):
+        line = _update_line_quantity(user_id, delta, unit_price, True, lookup)
+        if line is not None:
+            apply_cart_delta(user_id, delta, 0, line.unit_price * delta)
+        elif unit_price is not None:
+            # the stored price changed since the line was added (rare)
+            line = _update_line_quantity(user_id, delta, unit_price, False, lookup)
+            if line is not None:
+                rebuild_cart_summaries([user_id])
+    return line
+
+
+def _upsert_cart_line(user_id, product_id, variant_id, quantity, unit_price):
+    cart = connection.ops.quote_name(Cart._meta.db_table)
+    now = Cart._meta.get_field('updated_at').get_db_prep_save(timezone.now(), connection)
+    price_field = Cart._meta.get_field('stored_unit_price')
+    price = price_field.get_db_prep_save(unit_price, connection)
+    # a new line joins the coupon already applied to the cart
+    coupon = f"(SELECT coupon_id FROM {cart} WHERE user_id = %s AND NOT paid AND coupon_id IS NOT NULL LIMIT 1)"
+    # the conflict target is the unique_open_cart_line index; a merge only
+    # applies while it fits the stock and the price is unchanged
+    sql = (
+        f"INSERT INTO {cart} (user_id, product_id, variant_id, quantity, stored_unit_price, coupon_id, paid, created_at, updated_at) "
+        f"VALUES (%s, %s, %s, %s, %s, {coupon}, %s, %s, %s) "
+        f"ON CONFLICT (user_id, product_id, (COALESCE(variant_id, 0))) WHERE NOT paid "
+        f"DO UPDATE SET quantity = {cart}.quantity + excluded.quantity, updated_at = excluded.updated_at "
+        f"WHERE {cart}.quantity + excluded.quantity <= {_line_stock_sql(cart)} "
+        f"AND {cart}.stored_unit_price = excluded.stored_unit_price "
+        f"RETURNING id, quantity, stored_unit_price, coupon_id"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, product_id, variant_id, quantity, price, user_id, False, now, now])
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    line_id, new_quantity, price, coupon_id = row
+    return LineQuantity(line_id, new_quantity, price_field.to_python(price).quantize(Decimal('0.01')), coupon_id)
+
+
+def add_cart_line(user_id, product_id, variant_id, quantity, unit_price):
+    """
+    Put ``quantity`` of a product (variant) in the user's open cart: a new
+    line, or merged into the open line the unique_open_cart_line constraint
+    allows. On PostgreSQL and SQLite this is one INSERT ... ON CONFLICT DO
+    UPDATE, so concurrent adds cannot race each other into a duplicate
+    line. The caller checks ``quantity`` against the stock; merges are
+    checked here. Returns ``(LineQuantity, created)``, or ``(None, False)``
+    when merging would exceed the stock.
+    """
+    with transaction.atomic(savepoint=False):
+        if _can_return_from_update():
+            line = _upsert_cart_line(user_id, product_id, variant_id, quantity, unit_price)
+            if line is not None:
+                created = line.quantity == quantity
+                apply_cart_delta(user_id, quantity, 1 if created else 0, line.unit_price * quantity)
+                return line, created
+        # over the stock, repriced since it was added, or no upsert here
+        line = change_line_quantity(user_id, quantity, unit_price=unit_price,
+                                    product_id=product_id, variant_id=variant_id)
+        if line is not None:
+            return line, False
+        if _can_return_from_update() or Cart.objects.filter(
+                user_id=user_id, product_id=product_id, variant_id=variant_id, paid=False).exists():
+            # the open line cannot take that many more
+            return None, False
+        coupon_id = Cart.objects.filter(user_id=user_id, paid=False, coupon__isnull=False) \
+            .values_list('coupon_id', flat=True).first()
+        cart = Cart.objects.create(user_id=user_id, product_id=product_id, variant_id=variant_id, coupon_id=coupon_id,
+                                   quantity=quantity, stored_unit_price=unit_price, paid=False)
+        return LineQuantity(cart.id, cart.quantity, cart.stored_unit_price, cart.coupon_id), True
+
+
+@receiver(post_save, sender=Cart)
+def update_cart_summary(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_state = None if created else getattr(instance, '_summary_state', None)
+    if not created and old_state is None:
+        # nothing known about the previous row, recount this user
+        rebuild_cart_summaries([instance.user_id])
+    else:
+        old_user_id, old_paid, old_quantity, old_subtotal = old_state or (instance.user_id, True, 0, 0)
+        old = _summary_contribution(old_paid, old_quantity, old_subtotal)
+        new = _summary_contribution(instance.paid, instance.quantity, instance.subtotal)
+        if old_user_id != instance.user_id:
+            apply_cart_delta(old_user_id, *(-value for value in old))
+            apply_cart_delta(instance.user_id, *new)
+        elif old != new:
+            apply_cart_delta(instance.user_id, *(b - a for a, b in zip(old, new)))
+    instance._remember_summary_state()
+
+
+@receiver(post_delete, sender=Cart)
+def remove_cart_summary(sender, instance, **kwargs):
+    user_id, paid, quantity, subtotal = getattr(instance, '_summary_state', None) or (
+        instance.user_id, instance.paid, instance.quantity, instance.subtotal)
+    items, lines, total = _summary_contribution(paid, quantity, subtotal)
+    if lines:
+        # never create here: the user may be the one being deleted
+        apply_cart_delta(user_id, -items, -lines, -total, create=False)
+
+
+# ------------------------------
+# Coupon Cache Invalidation
+# ------------------------------
+@receiver([post_save, post_delete], sender=Coupon)
+def invalidate_coupon_cache(sender, instance, **kwargs):
+    # after commit, so no process can cache the old row again
+    transaction.on_commit(lambda: bump_version(COUPON_VERSION_KEY))
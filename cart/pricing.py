@@ -0,0 +1,151 @@
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from django.utils import timezone
+from cart.models import Coupon, Cart, load_cart_summary
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+
+def money(value) -> Decimal:
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+# ------------------------------
+# Priced Cart
+# ------------------------------
+@dataclass(frozen=True)
+class PricedLine:
+    line: Cart
+    subtotal: Decimal
+    discount: Decimal = ZERO
+
+    @property
+    def total(self) -> Decimal:
+        return self.subtotal - self.discount
+
+
+@dataclass(frozen=True)
+class PricedCart:
+    lines: tuple
+    # coupons that currently take money off (valid, minimum purchase met)
+    coupons: tuple
+    item_count: int
+    subtotal: Decimal
+    discount: Decimal
+    total: Decimal
+
+    @property
+    def line_count(self) -> int:
+        return len(self.lines)
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.lines
+
+    @property
+    def items(self):
+        # the Cart rows, in cart order, for templates
+        return [priced.line for priced in self.lines]
+
+    def get_line(self, line_id):
+        return next((priced for priced in self.lines if priced.line.id == line_id), None)
+
+    def as_json(self):
+        return {
+            'cart_count': self.item_count,
+            'line_count': self.line_count,
+            # the header total is the undiscounted one, as in CartSummary
+            'total_price': str(self.subtotal),
+            'subtotal': str(self.subtotal),
+            'discount': str(self.discount),
+            'grand_total': str(self.total),
+            'coupon': self.coupons[0].code if self.coupons else None,
+        }
+
+
+# ------------------------------
+# Pricing Engine
+# ------------------------------
+def coupon_discount(coupon, base, now) -> Decimal:
+    # what the coupon takes off ``base``; min_purchase is checked against
+    # the whole amount the coupon applies to, not line by line
+    if not coupon.is_valid_at(now) or base < coupon.min_purchase:
+        return ZERO
+    if coupon.discount_type == 'percent':
+        return min(base, money(base * coupon.discount_value / Decimal('100')))
+    if coupon.discount_type == 'fixed':
+        return min(base, money(coupon.discount_value))
+    return ZERO
+
+
+def allocate(amount, subtotals):
+    # split ``amount`` over the lines in proportion to their subtotals; the
+    # last line takes the rounding remainder so the parts add up exactly
+    base = sum(subtotals, ZERO)
+    if not amount or not base:
+        return [ZERO] * len(subtotals)
+    shares = [money(amount * subtotal / base) for subtotal in subtotals[:-1]]
+    return shares + [amount - sum(shares, ZERO)]
+
+
+def price_cart(user, lines=None, now=None) -> PricedCart:
+    """
+    Price a user's open cart in one pass: line subtotals from the stored
+    unit prices, coupon discounts on the total of the lines carrying each
+    coupon, and the cart totals, all rounded to the cent the same way.
+
+    ``lines`` is the user's unpaid Cart rows when the caller already has
+    them (e.g. with select_related for the template); otherwise they are
+    read here. Coupons take one query, and only when a line has one.
+    """
+    if lines is None:
+        lines = Cart.objects.filter(user=user, paid=False)
+    lines = list(lines)
+    now = now or timezone.now()
+
+    subtotals = [line.subtotal for line in lines]
+    coupon_ids = {line.coupon_id for line in lines if line.coupon_id}
+    coupons = Coupon.objects.in_bulk(coupon_ids) if coupon_ids else {}
+
+    discounts = [ZERO] * len(lines)
+    applied = []
+    for coupon_id, coupon in sorted(coupons.items()):
+        positions = [index for index, line in enumerate(lines) if line.coupon_id == coupon_id]
+        discount = coupon_discount(coupon, sum((subtotals[index] for index in positions), ZERO), now)
+        if discount:
+            applied.append(coupon)
+            for index, share in zip(positions, allocate(discount, [subtotals[index] for index in positions])):
+                discounts[index] = share
+
+    priced = tuple(PricedLine(line, subtotal, discount) for line, subtotal, discount in zip(lines, subtotals, discounts))
+    subtotal = sum(subtotals, ZERO)
+    discount = sum(discounts, ZERO)
+    return PricedCart(
+        lines=priced,
+        coupons=tuple(applied),
+        item_count=sum(line.quantity for line in lines),
+        subtotal=subtotal,
+        discount=discount,
+        total=max(subtotal - discount, ZERO),
+    )
+
+
+def cart_totals_json(user, coupon_id=None):
+    """
+    Totals for the cart JSON views. The header badge and the undiscounted
+    total come from the CartSummary row; the lines are only priced when
+    the cart has a coupon. A coupon always covers the whole cart (see
+    CouponView and add_cart_line), so ``coupon_id``, the coupon of the line
+    the view just changed, tells whether it has one.
+    """
+    if coupon_id is not None:
+        return price_cart(user).as_json()
+    summary = load_cart_summary(user.pk)
+    return {
+        **summary.as_json(),
+        'subtotal': str(summary.total),
+        'discount': str(ZERO),
+        'grand_total': str(summary.total),
+        'coupon': None,
+    }
@@ -1,3 +1,289 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from store.models import Category, Brand, Product, ProductVariant, Color, Size
+from cart.models import Coupon, Cart, CartSummary, add_cart_line
+from cart.pricing import price_cart
+from cart.coupons import coupon_cache, resolve_coupon
 
-# Create your tests here.
+User = get_user_model()
+
+
+# =========================================================
+# LOADED RELATIONS VALIDATION
+# =========================================================
+class LoadedRelationsValidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        category = Category.objects.create(title='Shirts')
+        brand = Brand.objects.create(title='Acme')
+        cls.product = Product.objects.create(
+            category=category, brand=brand, title='Plain Shirt', variant='size',
+            old_price=Decimal('100.00'), available_stock=10
+        )
+        cls.variant = ProductVariant.objects.create(
+            product=cls.product, size=Size.objects.create(title='Medium', code='M'),
+            color=Color.objects.create(title='Black', code='#000'), sku='PLAIN-M', available_stock=5
+        )
+        cls.cart = Cart.objects.create(user=cls.user, product=cls.product, variant=cls.variant, quantity=1)
+
+    def test_save_with_loaded_relations_skips_foreign_key_lookups(self):
+        cart = Cart.objects.select_related('user', 'product', 'variant').get(pk=self.cart.pk)
+        cart.quantity = 2
+        # the UPDATE and the cart summary delta: user, product and variant
+        # are not looked up again
+        with self.assertNumQueries(2):
+            cart.save()
+
+    def test_save_without_loaded_relations_still_checks_foreign_keys(self):
+        cart = Cart.objects.get(pk=self.cart.pk)
+        cart.quantity = 2
+        # one existence query per foreign key, clean() loads the variant
+        with self.assertNumQueries(6):
+            cart.save()
+
+    def test_stock_rule_still_enforced(self):
+        cart = Cart.objects.select_related('user', 'product', 'variant').get(pk=self.cart.pk)
+        cart.quantity = 6
+        with self.assertRaises(ValidationError):
+            cart.save()
+
+    def test_unsaved_related_instance_is_still_validated(self):
+        cart = Cart.objects.select_related('user', 'product', 'variant').get(pk=self.cart.pk)
+        cart.user_id = self.user.pk + 100
+        with self.assertRaises(ValidationError):
+            cart.full_clean()
+
+    def test_quantity_view_query_count(self):
+        self.client.force_login(self.user)
+        # session, user, conditional UPDATE ... RETURNING, summary delta, summary read
+        with self.assertNumQueries(5):
+            response = self.client.post(reverse('qty-inc-dec'), {'cart_id': self.cart.pk, 'action': 'inc'})
+        self.assertEqual(response.json()['quantity'], 2)
+
+    def test_line_above_a_dropped_stock_can_still_be_reduced(self):
+        Cart.objects.filter(pk=self.cart.pk).update(quantity=5)
+        ProductVariant.objects.filter(pk=self.variant.pk).update(available_stock=2)
+        self.client.force_login(self.user)
+        url = reverse('qty-inc-dec')
+        response = self.client.post(url, {'cart_id': self.cart.pk, 'action': 'dec'}).json()
+        self.assertEqual((response['status'], response['quantity']), ('success', 4))
+        response = self.client.post(url, {'cart_id': self.cart.pk, 'action': 'inc'}).json()
+        self.assertEqual(response['message'], 'Maximum stock reached')
+        self.assertEqual(Cart.objects.get(pk=self.cart.pk).quantity, 4)
+
+
+# =========================================================
+# ONE OPEN LINE PER PRODUCT
+# =========================================================
+class OpenCartLineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        cls.product = Product.objects.create(
+            category=Category.objects.create(title='Mugs'), brand=Brand.objects.create(title='Acme'),
+            title='Mug', old_price=Decimal('10.00'), available_stock=5
+        )
+
+    def test_second_open_line_is_rejected(self):
+        Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        with self.assertRaises(ValidationError):
+            Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        # paid lines are order history, any number of them
+        Cart.objects.create(user=self.user, product=self.product, quantity=1, paid=True)
+        Cart.objects.create(user=self.user, product=self.product, quantity=1, paid=True)
+
+    def test_add_cart_line_merges_into_the_open_line(self):
+        line, created = add_cart_line(self.user.pk, self.product.pk, None, 2, Decimal('10.00'))
+        self.assertTrue(created)
+        line, created = add_cart_line(self.user.pk, self.product.pk, None, 3, Decimal('10.00'))
+        self.assertFalse(created)
+        self.assertEqual(line.quantity, 5)
+        # over the stock: nothing changes
+        self.assertEqual(add_cart_line(self.user.pk, self.product.pk, None, 1, Decimal('10.00')), (None, False))
+        self.assertEqual(Cart.objects.get(user=self.user, paid=False).quantity, 5)
+        summary = CartSummary.objects.get(user=self.user)
+        self.assertEqual((summary.item_count, summary.line_count, summary.total), (5, 1, Decimal('50.00')))
+
+
+# =========================================================
+# CART PRICING
+# =========================================================
+class CartPricingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        category, brand = Category.objects.create(title='Mugs'), Brand.objects.create(title='Acme')
+        cls.mug = Product.objects.create(category=category, brand=brand, title='Mug', old_price=Decimal('10.00'), available_stock=9)
+        cls.cup = Product.objects.create(category=category, brand=brand, title='Cup', old_price=Decimal('3.33'), available_stock=9)
+
+    def add_lines(self, coupon=None):
+        Cart.objects.create(user=self.user, product=self.mug, quantity=3, coupon=coupon)
+        Cart.objects.create(user=self.user, product=self.cup, quantity=1, coupon=coupon)
+
+    def test_min_purchase_is_checked_against_the_cart(self):
+        # each line is below the minimum, the cart (26.66) is not
+        coupon = Coupon.objects.create(code='TEN', discount_type='percent', discount_value=10, min_purchase=25)
+        self.add_lines(coupon)
+        with self.assertNumQueries(2):
+            cart = price_cart(self.user)
+        self.assertEqual((cart.item_count, cart.subtotal, cart.discount, cart.total),
+                         (4, Decimal('26.66'), Decimal('2.67'), Decimal('23.99')))
+        self.assertEqual(sum(line.discount for line in cart.lines), cart.discount)
+        self.assertEqual(cart.as_json()['coupon'], 'TEN')
+
+    def test_invalid_coupon_takes_nothing_off(self):
+        coupon = Coupon.objects.create(code='OFF', discount_type='fixed', discount_value=50, active=False)
+        self.add_lines(coupon)
+        cart = price_cart(self.user)
+        self.assertEqual((cart.discount, cart.total, cart.coupons), (Decimal('0.00'), Decimal('26.66'), ()))
+
+    def test_cart_without_coupons_is_one_query(self):
+        self.add_lines()
+        with self.assertNumQueries(1):
+            cart = price_cart(self.user)
+        self.assertEqual(cart.total, Decimal('26.66'))
+
+
+# =========================================================
+# COUPONS
+# =========================================================
+class CouponTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        category, brand = Category.objects.create(title='Mugs'), Brand.objects.create(title='Acme')
+        cls.mug = Product.objects.create(category=category, brand=brand, title='Mug', old_price=Decimal('10.00'), available_stock=9)
+        cls.cup = Product.objects.create(category=category, brand=brand, title='Cup', old_price=Decimal('5.00'), available_stock=9)
+        cls.coupon = Coupon.objects.create(code='Spring10', discount_type='percent', discount_value=10, min_purchase=20)
+
+    def setUp(self):
+        coupon_cache.clear()
+        self.client.force_login(self.user)
+
+    def apply(self, code, action='apply'):
+        return self.client.post(reverse('cart-coupon'), {'coupon_code': code, 'action': action}).json()
+
+    def test_codes_are_resolved_once_per_process(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_coupon(' spring10 '), self.coupon)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_coupon('SPRING10'), self.coupon)
+
+    def test_unknown_codes_are_cached_too(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(resolve_coupon('NOPE'))
+            self.assertIsNone(resolve_coupon('nope'))
+
+    def test_coupon_change_drops_the_cache(self):
+        resolve_coupon('SPRING10')
+        with self.captureOnCommitCallbacks(execute=True):
+            Coupon.objects.filter(pk=self.coupon.pk).first().delete()
+        self.assertIsNone(resolve_coupon('SPRING10'))
+
+    def test_cache_entry_ends_at_expiry(self):
+        now = timezone.now()
+        Coupon.objects.filter(pk=self.coupon.pk).update(expiry_date=now + timedelta(seconds=5))
+        self.assertIsNotNone(resolve_coupon('SPRING10', now))
+        self.assertIsNone(resolve_coupon('SPRING10', now + timedelta(seconds=10)))
+
+    def test_apply_and_remove(self):
+        Cart.objects.create(user=self.user, product=self.mug, quantity=2)
+        self.assertEqual(self.apply('spring10')['status'], 'error')  # 16.00 < 20
+        Cart.objects.create(user=self.user, product=self.cup, quantity=1)
+
+        response = self.apply('spring10')
+        # the header total stays undiscounted on every page
+        self.assertEqual((response['status'], response['coupon'], response['total_price'], response['grand_total']),
+                         ('success', 'Spring10', '20.00', '18.00'))
+        line = Cart.objects.get(product=self.mug)
+        response = self.client.post(reverse('qty-inc-dec'), {'cart_id': line.pk, 'action': 'inc'}).json()
+        self.assertEqual((response['total_price'], response['grand_total']), ('28.00', '25.20'))
+        self.client.post(reverse('qty-inc-dec'), {'cart_id': line.pk, 'action': 'dec'})
+        # lines added later share the cart's coupon
+        Cart.objects.filter(product=self.cup).delete()
+        line, created = add_cart_line(self.user.pk, self.cup.pk, None, 1, Decimal('4.00'))
+        self.assertEqual(Cart.objects.get(pk=line.id).coupon, self.coupon)
+
+        response = self.apply('', action='remove')
+        self.assertEqual((response['coupon'], response['total_price'], response['grand_total']), (None, '20.00', '20.00'))
+        self.assertEqual(self.apply('BOGUS')['message'], 'Invalid or expired coupon code.')
+
+
+# =========================================================
+# CONCURRENT QUANTITY CHANGES
+# =========================================================
+class ConcurrentQuantityTests(TransactionTestCase):
+    threads = 8
+    clicks = 10
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        self.product = Product.objects.create(
+            category=Category.objects.create(title='Shirts'), brand=Brand.objects.create(title='Acme'),
+            title='Plain Shirt', variant='none', old_price=Decimal('100.00'), available_stock=1000
+        )
+        self.cart = Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        self.client.force_login(self.user)
+
+    def hammer(self, url, data):
+        # every thread posts `clicks` times, all threads start together
+        barrier = threading.Barrier(self.threads)
+        responses, errors = [], []
+
+        def worker():
+            client = Client()
+            client.cookies = self.client.cookies
+            try:
+                barrier.wait()
+                for _ in range(self.clicks):
+                    responses.append(client.post(url, data).json())
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(errors, [])
+        return [response for response in responses if response['status'] == 'success']
+
+    def assertSummaryMatchesCart(self):
+        summary = CartSummary.objects.get(user=self.user)
+        cart = Cart.objects.get(pk=self.cart.pk)
+        self.assertEqual((summary.item_count, summary.total), (cart.quantity, cart.subtotal))
+
+    def test_concurrent_increments_are_not_lost(self):
+        succeeded = self.hammer(reverse('qty-inc-dec'), {'cart_id': self.cart.pk, 'action': 'inc'})
+        self.assertEqual(len(succeeded), self.threads * self.clicks)
+        self.assertEqual(Cart.objects.get(pk=self.cart.pk).quantity, 1 + self.threads * self.clicks)
+        # every response saw its own increment
+        self.assertEqual(len({response['quantity'] for response in succeeded}), len(succeeded))
+        self.assertSummaryMatchesCart()
+
+    def test_concurrent_increments_stop_at_stock(self):
+        Product.objects.filter(pk=self.product.pk).update(available_stock=20)
+        succeeded = self.hammer(reverse('qty-inc-dec'), {'cart_id': self.cart.pk, 'action': 'inc'})
+        self.assertEqual(len(succeeded), 19)
+        self.assertEqual(Cart.objects.get(pk=self.cart.pk).quantity, 20)
+        self.assertSummaryMatchesCart()
+
+    def test_concurrent_add_to_cart_merges_every_request(self):
+        succeeded = self.hammer(reverse('add-to-cart'), {
+            'product_slug': self.product.slug, 'product_id': self.product.pk, 'quantity': 2,
+        })
+        self.assertEqual(len(succeeded), self.threads * self.clicks)
+        self.assertEqual(Cart.objects.get(pk=self.cart.pk).quantity, 1 + 2 * self.threads * self.clicks)
+        self.assertSummaryMatchesCart()
@@ -1,15 +1,16 @@
 from django.views import generic
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404
 from django.shortcuts import get_object_or_404, render
 from django.db import transaction
-from django.db.models import F, Sum
 from django.urls import reverse_lazy
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import never_cache
 from store.models import Product, ProductVariant
-from cart.models import Coupon, Cart, Wishlist
-from decimal import Decimal
+from store.metrics import CART_EVENTS
+from cart.models import Coupon, Cart, Wishlist, load_cart_summary, change_line_quantity, add_cart_line
+from cart.coupons import resolve_coupon
+from cart.pricing import price_cart, cart_totals_json
 import logging
 
 logger = logging.getLogger('project')
@@ -41,7 +42,8 @@ class AddToCartView(LoginRequiredMixin, generic.View):
             if product.variant != 'none':
                 if not variant_id:
                     return JsonResponse({"status": "error", "message": "Please select a product variant."})
-                variant = get_object_or_404(ProductVariant.objects.select_for_update(), id=variant_id, product=product, status='active')
+                variant = get_object_or_404(ProductVariant.objects.select_for_update(of=('self',)).select_related('gallery_image'),
+                                            id=variant_id, product=product, status='active')
 
             # Determine available stock
             max_stock = variant.available_stock if variant else product.available_stock
@@ -54,49 +56,33 @@ class AddToCartView(LoginRequiredMixin, generic.View):
             # Determine unit price (stored_unit_price)
             unit_price = variant.variant_price if variant and variant.variant_price > 0 else product.sale_price
 
-            # Merge with existing cart if exists
-            cart_item = Cart.objects.filter(user=request.user, product=product, variant=variant, paid=False).first()
-
-            if cart_item:
-                new_quantity = cart_item.quantity + quantity
-                if new_quantity > max_stock:
-                    return JsonResponse({
-                        "status": "error",
-                        "message": f"Cannot exceed available stock ({max_stock})."
-                    })
-                cart_item.quantity = new_quantity
-                cart_item.stored_unit_price = unit_price
-                cart_item.save()
-                final_quantity = new_quantity
-                message = "Product quantity updated in cart successfully."
-            else:
-                Cart.objects.create(
-                    user=request.user,
-                    product=product,
-                    variant=variant,
-                    quantity=quantity,
-                    stored_unit_price=unit_price,
-                    paid=False
-                )
-                final_quantity = quantity
-                message = "Product added to cart successfully."
-
-            # Cart summary
-            cart_summary = Cart.objects.filter(user=request.user, paid=False).aggregate(
-                total_price=Sum(F('quantity') * F('stored_unit_price')),
-                cart_count=Sum(F('quantity'))
+            if quantity > max_stock:
+                return JsonResponse({
+                    "status": "error",
+                    "message": f"Cannot exceed available stock ({max_stock})."
+                })
+
+            # New line or merged into the open one, in one upsert
+            line, created = add_cart_line(
+                request.user.pk, product.id, variant.id if variant else None, quantity, unit_price
             )
-            cart_count = cart_summary['cart_count'] or 0
-            total_price = Decimal(cart_summary['total_price'] or 0).quantize(Decimal('0.01'))
+            if line is None:
+                return JsonResponse({
+                    "status": "error",
+                    "message": f"Cannot exceed available stock ({max_stock})."
+                })
+            final_quantity = line.quantity
+            message = "Product added to cart successfully." if created else "Product quantity updated in cart successfully."
+            CART_EVENTS.inc(action='add')
+
+            # Cart totals, this line included
+            totals = cart_totals_json(request.user, line.coupon_id)
 
             # Image resolve
-            image_url = None
             if variant and variant.image_url:
                 image_url = variant.image_url
-            elif product.images.exists():
-                image_url = product.images.first().image.url
             else:
-                image_url = "/media/defaults/default.jpg"
+                image_url = product.cover_image.url
 
             # JSON response
             return JsonResponse({
@@ -106,9 +92,8 @@ class AddToCartView(LoginRequiredMixin, generic.View):
                 "unit_price": str(unit_price),
                 "quantity": final_quantity,
                 "available_stock": max_stock,
-                "cart_count": cart_count,
-                "total_price": str(total_price),
-                "image_url": image_url
+                "image_url": image_url,
+                **totals
             })
 
 
@@ -116,11 +101,11 @@ class AddToCartView(LoginRequiredMixin, generic.View):
 class CartDetailView(LoginRequiredMixin, generic.View):
     login_url = reverse_lazy('sign-in')
     def get(self, request):
-        cart_items = Cart.objects.filter(user=request.user, paid=False).select_related('product','variant')
-        total_price = sum([item.subtotal for item in cart_items])
+        cart_items = Cart.objects.filter(user=request.user, paid=False).select_related('product', 'variant', 'variant__gallery_image', 'variant__color', 'variant__size')
+        cart = price_cart(request.user, cart_items)
         return render(request, "cart/cart-detail.html", {
-            "cart_items": cart_items,
-            "total_price": total_price
+            "cart": cart,
+            "cart_items": cart.items,
         })
 
 
@@ -129,42 +114,31 @@ class QuantityIncDec(LoginRequiredMixin, generic.View):
     login_url = reverse_lazy('sign-in')
 
     def post(self, request):
-        cart_id = request.POST.get("cart_id")
+        cart_id = request.POST.get("cart_id", "")
         action = request.POST.get("action")
 
-        cart_item = get_object_or_404(Cart, id=cart_id, user=request.user, paid=False)
-
-        max_stock = cart_item.variant.available_stock if cart_item.variant else cart_item.product.available_stock
-
-        if action == "inc":
-            if cart_item.quantity < max_stock:
-                cart_item.quantity += 1
-                message = "Quantity increased"
-            else:
-                return JsonResponse({'status': 'error', 'message': 'Maximum stock reached'})
-
-        elif action == "dec":
-            if cart_item.quantity > 1:
-                cart_item.quantity -= 1
-                message = "Quantity decreased"
-            else:
-                return JsonResponse({'status': 'error', 'message': 'Minimum quantity is 1'})
-        else:
+        if action not in ("inc", "dec"):
             return JsonResponse({'status': 'error', 'message': 'Invalid action'})
-
-        # Save after changing quantity
-        cart_item.save()
-
-        # Recalculate cart total
-        cart_items = Cart.objects.filter(user=request.user, paid=False)
-        cart_total = sum(item.subtotal for item in cart_items)
-
+        if not cart_id.isdigit():
+            raise Http404
+
+        # read-modify-write in one statement: two quick clicks are two
+        # increments, and the stock limit is checked against current stock
+        line = change_line_quantity(request.user.pk, 1 if action == "inc" else -1, id=int(cart_id))
+        if line is None:
+            get_object_or_404(Cart, id=cart_id, user=request.user, paid=False)
+            message = 'Maximum stock reached' if action == "inc" else 'Minimum quantity is 1'
+            return JsonResponse({'status': 'error', 'message': message})
+        totals = cart_totals_json(request.user, line.coupon_id)
+
+        CART_EVENTS.inc(action=action)
         return JsonResponse({
             "status": "success",
-            "message": message,
-            "quantity": cart_item.quantity,
-            "item_total": float(cart_item.subtotal),
-            "cart_total": float(cart_total)
+            "message": "Quantity increased" if action == "inc" else "Quantity decreased",
+            "quantity": line.quantity,
+            "item_total": float(line.subtotal),
+            "cart_total": float(totals['grand_total']),
+            **totals
         })
         
         
@@ -180,16 +154,54 @@ class CartRemoveView(LoginRequiredMixin, generic.View):
         # Get the cart item
         cart_item = get_object_or_404(Cart, id=cart_id, user=request.user, paid=False)
         cart_item.delete()
+        CART_EVENTS.inc(action='remove')
 
-        # Recalculate cart info
-        cart_items = Cart.objects.filter(user=request.user, paid=False)
-        total_price = sum(item.subtotal for item in cart_items)
-        cart_count = cart_items.count()
+        totals = cart_totals_json(request.user, cart_item.coupon_id)
 
         return JsonResponse({
             "status": "success",
             "message": "Item removed from cart",
-            "cart_count": cart_count,
-            "total_price": float(total_price),
-            "cart_empty": cart_count == 0
-        })
\ No newline at end of file
+            **totals,
+            "total_price": float(totals['total_price']),
+            "cart_empty": totals['line_count'] == 0
+        })
+
+
+@method_decorator(never_cache, name='dispatch')
+class CouponView(LoginRequiredMixin, generic.View):
+    login_url = reverse_lazy('sign-in')
+
+    def post(self, request):
+        action = request.POST.get("action", "apply")
+        if action not in ("apply", "remove"):
+            return JsonResponse({'status': 'error', 'message': 'Invalid action'})
+
+        lines = Cart.objects.filter(user=request.user, paid=False)
+        if action == "apply":
+            # code lookups come from the process-wide coupon cache
+            coupon = resolve_coupon(request.POST.get("coupon_code"))
+            if coupon is None:
+                return JsonResponse({"status": "error", "message": "Invalid or expired coupon code."})
+            summary = load_cart_summary(request.user.pk)
+            if not summary.line_count:
+                return JsonResponse({"status": "error", "message": "Your cart is empty."})
+            if summary.total < coupon.min_purchase:
+                return JsonResponse({
+                    "status": "error",
+                    "message": f"This coupon needs a minimum purchase of ${coupon.min_purchase}."
+                })
+            # one coupon per cart: it replaces whatever was applied before
+            lines.update(coupon=coupon)
+            message = f"Coupon {coupon.code} applied."
+        else:
+            lines.filter(coupon__isnull=False).update(coupon=None)
+            message = "Coupon removed."
+        CART_EVENTS.inc(action=f'coupon_{action}')
+
+        cart = price_cart(request.user)
+        return JsonResponse({
+            "status": "success",
+            "message": message,
+            "cart_total": float(cart.total),
+            **cart.as_json()
+        })
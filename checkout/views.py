@@ -9,6 +9,7 @@ from django.urls import reverse_lazy
 from django.db.models import Sum, F
 from checkout.models import Checkout
 from cart.models import Cart
+from cart.pricing import price_cart
 from account.models import Profile
 User = get_user_model()
 logger = logging.getLogger('project')
@@ -17,16 +18,17 @@ logger = logging.getLogger('project')
 class CheckoutView(LoginRequiredMixin, generic.View):
     login_url = reverse_lazy('sign-in')
     def get(self, request):
-        checkout_items = Cart.objects.filter(user=request.user, paid=False).select_related("product")
-        summary = checkout_items.aggregate(total_price=Sum(F("quantity") * F("product__sale_price")))
+        # priced from the stored unit prices, coupons included
+        cart = price_cart(request.user, Cart.objects.filter(user=request.user, paid=False).select_related("product"))
         shipping_cost = 120
-        grand_total = (summary['total_price'] or 0) + shipping_cost
+        grand_total = cart.total + shipping_cost
         profiles = Profile.objects.filter(user=request.user)
 
-        logger.info(f"User {request.user.username} visited checkout page. Items count: {checkout_items.count()}, Grand total: {grand_total}")
+        logger.info(f"User {request.user.username} visited checkout page. Items count: {cart.line_count}, Grand total: {grand_total}")
 
         context = {
-            "checkout_items": checkout_items,
+            "cart": cart,
+            "checkout_items": cart.items,
             "shipping_cost": shipping_cost,
             "grand_total": grand_total,
             "profiles": profiles,
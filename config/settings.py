@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so its total covers the rest of the stack
+    'store.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,10 +85,41 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # take the write lock when a transaction starts and wait for it:
+            # a deferred transaction that reads first cannot upgrade while
+            # another writer holds the lock and fails with "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # a file, not shared-cache memory, so concurrent tests can write
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
 
+# Cache
+# Catalog, coupon and facet caches are invalidated by bumping a version key.
+# With several worker processes the cache must be shared for a bump in one
+# worker to reach the others: set REDIS_URL. Without it every process has
+# its own LocMemCache, and store.cache caps every cached value (and the
+# version keys) at LOCAL_CACHE_MAX_AGE seconds instead.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+LOCAL_CACHE_MAX_AGE = 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -145,6 +178,19 @@ EMAIL_PORT = 587
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# ============================= request timing ==========================
+# Server-Timing header on every response; a sample of requests (and every
+# slow one) is logged to 'project.request_timing' as JSON
+REQUEST_TIMING_HEADER = True
+REQUEST_TIMING_SAMPLE_RATE = 0.05
+REQUEST_TIMING_SLOW_MS = 500
+
+# ============================= metrics =================================
+# With several worker processes, point METRICS_DIR at a directory they all
+# can write; /metrics/ then adds up every worker's counters
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 5
+
 # ============================= logging =================================
 LOGGING = {
     'version': 1,
@@ -243,5 +289,14 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+
+        # sampled request timings (store.middleware), through the 'project'
+        # handlers; config.test_runner keeps them out of test runs
+        'project.request_timing': {
+            'level': 'INFO',
+            'propagate': True,
+        },
     }
 }
+
+TEST_RUNNER = 'config.test_runner.TestRunner'
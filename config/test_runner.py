@@ -0,0 +1,21 @@
+import logging
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    The default runner, with the sampled request timing log switched off:
+    test requests would flood the console and the log files under logs/.
+    Tests that check the records use assertLogs, which still sees them.
+    """
+    timing_logger = 'project.request_timing'
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        logger = logging.getLogger(self.timing_logger)
+        self._timing_propagate = logger.propagate
+        logger.propagate = False
+
+    def teardown_test_environment(self, **kwargs):
+        logging.getLogger(self.timing_logger).propagate = self._timing_propagate
+        super().teardown_test_environment(**kwargs)
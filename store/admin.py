@@ -65,7 +65,11 @@ class ProductVariantInline(admin.TabularInline):
     model = ProductVariant
     extra = 1
     readonly_fields = ('image_tag',)
-    fields = ('id', 'title', 'color', 'size', 'sku', 'variant_price', 'available_stock', 'status', 'image_id', 'image_tag')
+    fields = ('id', 'title', 'color', 'size', 'sku', 'variant_price', 'available_stock', 'status', 'gallery_image', 'image_tag')
+    raw_id_fields = ('gallery_image',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('gallery_image')
 
 
 # =========================================================
@@ -107,11 +111,13 @@ class ProductAdmin(ImagePreviewMixin, admin.ModelAdmin):
 # =========================================================
 @admin.register(ProductVariant)
 class ProductVariantAdmin(ImagePreviewMixin, admin.ModelAdmin):
-    list_display = ('id', 'title', 'product', 'color', 'size', 'image_id', 'sku', 'final_price', 'available_stock', 'status', 'image_tag')
+    list_display = ('id', 'title', 'product', 'color', 'size', 'gallery_image', 'sku', 'final_price', 'available_stock', 'status', 'image_tag')
     list_filter = ('status', 'color', 'size', 'product', 'title', 'sku')
     search_fields = ('product__title', 'color__title', 'size__title', 'sku')
     readonly_fields = ('image_tag',)
-    list_editable = ('status', 'available_stock', 'image_id', 'title', 'color', 'size', 'sku')
+    list_editable = ('status', 'available_stock', 'gallery_image', 'title', 'color', 'size', 'sku')
+    list_select_related = ('product', 'color', 'size', 'gallery_image__product')
+    raw_id_fields = ('gallery_image',)
 
 
 
@@ -0,0 +1,164 @@
+import re
+import threading
+from bisect import bisect_left, insort
+from django.db import connections
+from django.urls import reverse
+from store.cache import get_catalog_version
+from store.metrics import record_cache
+
+SUGGESTION_LIMIT = 8
+
+
+def normalize(text):
+    return ' '.join(re.findall(r'\w+', (text or '').lower()))
+
+
+# =========================================================
+# PREFIX INDEX
+# =========================================================
+class PrefixIndex:
+    """
+    Sorted array of (key, kind, id) searched with bisect. Every word start
+    of a title is a key, so "shi" finds "Black T-Shirt" as well as "Shirt
+    Collections". Entries are plain dicts ready to be returned as JSON.
+    """
+    def __init__(self, version=None):
+        self.version = version
+        self.keys = []
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _keys(title):
+        words = normalize(title).split()
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    def add(self, kind, obj_id, title, slug, url=None):
+        with self.lock:
+            self._remove(kind, obj_id)
+            entry = {'type': kind, 'id': obj_id, 'title': title, 'slug': slug}
+            if url:
+                entry['url'] = url
+            self.entries[(kind, obj_id)] = entry
+            for key in self._keys(title):
+                insort(self.keys, (key, kind, obj_id))
+
+    def remove(self, kind, obj_id):
+        with self.lock:
+            self._remove(kind, obj_id)
+
+    def _remove(self, kind, obj_id):
+        entry = self.entries.pop((kind, obj_id), None)
+        if entry is None:
+            return
+        for key in self._keys(entry['title']):
+            position = bisect_left(self.keys, (key, kind, obj_id))
+            if position < len(self.keys) and self.keys[position] == (key, kind, obj_id):
+                del self.keys[position]
+
+    def suggest(self, prefix, limit=SUGGESTION_LIMIT):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        keys = self.keys
+        seen = set()
+        matches = []
+        with self.lock:
+            position = bisect_left(keys, (prefix,))
+            while position < len(keys) and keys[position][0].startswith(prefix) and len(matches) < limit * 4:
+                _, kind, obj_id = keys[position]
+                entry = self.entries.get((kind, obj_id))
+                if entry and (kind, obj_id) not in seen:
+                    seen.add((kind, obj_id))
+                    matches.append(entry)
+                position += 1
+        # titles that start with the prefix first, then shorter titles
+        matches.sort(key=lambda entry: (not normalize(entry['title']).startswith(prefix), len(entry['title'])))
+        return matches[:limit]
+
+    # ---------------------------------------------------------
+    # BUILD
+    # ---------------------------------------------------------
+    @classmethod
+    def build(cls, version=None):
+        from store.models import Product, Category, Brand
+        index = cls(version)
+        rows = [
+            ('category', Category.objects.filter(status='active').values_list('id', 'title', 'slug')),
+            ('brand', Brand.objects.filter(status='active').values_list('id', 'title', 'slug')),
+            ('product', Product.objects.filter(status='active', available_stock__gt=0)
+                .values_list('id', 'title', 'slug').iterator(chunk_size=5000)),
+        ]
+        # append and sort once; insort per entry would be quadratic
+        for kind, values in rows:
+            for obj_id, title, slug in values:
+                entry = {'type': kind, 'id': obj_id, 'title': title, 'slug': slug}
+                if kind == 'product':
+                    entry['url'] = product_url(slug, obj_id)
+                index.entries[(kind, obj_id)] = entry
+                index.keys.extend((key, kind, obj_id) for key in cls._keys(title))
+        index.keys.sort()
+        return index
+
+
+def product_url(slug, obj_id):
+    return reverse('product-detail', args=[slug, obj_id]) if slug else None
+
+
+# =========================================================
+# PROCESS-WIDE INDEX
+# =========================================================
+# The request path only ever reads the in-memory index. A missing or stale
+# index (another process changed the catalog) is rebuilt in a background
+# thread while the current one keeps answering.
+_index = None
+_rebuilding = threading.Lock()
+
+
+class IndexBuildThread(threading.Thread):
+    def __init__(self, version):
+        super().__init__(daemon=True)
+        self.version = version
+
+    def run(self):
+        global _index
+        try:
+            _index = PrefixIndex.build(self.version)
+        finally:
+            connections.close_all()
+            _rebuilding.release()
+
+
+def get_autocomplete_index():
+    version = get_catalog_version()
+    current = _index is not None and _index.version == version
+    record_cache('autocomplete_index', current)
+    if not current and _rebuilding.acquire(blocking=False):
+        IndexBuildThread(version).start()
+    return _index
+
+
+def warm_autocomplete_index():
+    # synchronous build, for management commands and tests
+    global _index
+    _index = PrefixIndex.build(get_catalog_version())
+    return _index
+
+
+def apply_catalog_change(kind, instance, deleted=False, previous_version=None):
+    """
+    Incremental update of this process' index from a model signal. If the
+    catalog bump that accompanied this change is the only one since the
+    index was built, the index stays current instead of being rebuilt.
+    """
+    index = _index
+    if index is None:
+        return
+    if deleted or instance.status != 'active' or (kind == 'product' and instance.available_stock <= 0):
+        index.remove(kind, instance.pk)
+    else:
+        url = product_url(instance.slug, instance.pk) if kind == 'product' else None
+        index.add(kind, instance.pk, instance.title, instance.slug, url)
+    version = get_catalog_version()
+    if previous_version is not None and index.version == previous_version and version == previous_version + 1:
+        index.version = version
@@ -0,0 +1,197 @@
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from store.cache import bump_catalog_version
+from store.middleware import QueryRecorder
+from store.models import Product, ProductVariant
+from store.variants import variant_matrix_key
+from cart.coupons import coupon_cache
+from cart.models import Cart, cart_summary_key
+
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), 'benchmark_budgets.json')
+XHR = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+@dataclass
+class Endpoint:
+    name: str
+    method: str
+    path: str
+    data: dict = field(default_factory=dict)
+    headers: dict = field(default_factory=dict)
+
+
+@dataclass
+class EndpointResult:
+    name: str
+    status: int
+    queries: int
+    cold_queries: int
+    p50_ms: float
+    p95_ms: float
+    sql_ms: float
+
+    def as_dict(self):
+        return {
+            'status': self.status, 'queries': self.queries, 'cold_queries': self.cold_queries,
+            'p50_ms': round(self.p50_ms, 2), 'p95_ms': round(self.p95_ms, 2), 'sql_ms': round(self.sql_ms, 2),
+        }
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+# =========================================================
+# ENDPOINTS
+# =========================================================
+def pick_product():
+    # the most popular active product with variants: the detail page and the
+    # variant views do the most work for it
+    return Product.objects.filter(status='active', available_stock__gt=0, variants__status='active') \
+        .annotate(variant_count=Count('variants')) \
+        .order_by('-sold', '-variant_count', 'id').first()
+
+
+def build_endpoints(product, cart_id=None):
+    variant = ProductVariant.objects.filter(product=product, status='active', available_stock__gt=0) \
+        .order_by('id').first()
+    endpoints = [
+        Endpoint('home', 'get', reverse('home')),
+        Endpoint('shop', 'get', reverse('shop')),
+        Endpoint('shop_xhr', 'get', reverse('shop'), {'per_page': 12}, XHR),
+        Endpoint('filter_products', 'post', reverse('get-filter-products'), {'category[]': [product.category_id]}, XHR),
+        Endpoint('product_detail', 'get', reverse('product-detail', args=[product.slug, product.id])),
+        Endpoint('cart_detail', 'get', reverse('cart-detail')),
+    ]
+    if variant:
+        endpoints += [
+            Endpoint('variant_by_size', 'post', reverse('get-variant-by-size'),
+                     {'product_id': product.id, 'size_id': variant.size_id}, XHR),
+            Endpoint('variant_by_color', 'post', reverse('get-variant-by-color'),
+                     {'product_id': product.id, 'variant_id': variant.id}, XHR),
+        ]
+    endpoints.append(Endpoint('add_to_cart', 'post', reverse('add-to-cart'), {
+        'product_slug': product.slug, 'product_id': product.id,
+        'variant_id': variant.id if variant else '', 'quantity': 1,
+    }, XHR))
+    if cart_id:
+        endpoints += [
+            Endpoint('cart_quantity', 'post', reverse('qty-inc-dec'), {'cart_id': cart_id, 'action': 'inc'}, XHR),
+            Endpoint('cart_remove', 'post', reverse('cart-remove-item'), {'cart_id': cart_id}, XHR),
+        ]
+    return endpoints
+
+
+# =========================================================
+# RUNNER
+# =========================================================
+def drop_caches(user, product):
+    """
+    Make the next request build everything the benchmark touches: catalog
+    keys (store context, home sections, facets) follow the catalog version,
+    the rest is deleted by key. Other entries in the cache are left alone.
+    """
+    bump_catalog_version()
+    cache.delete_many([variant_matrix_key(product.id), cart_summary_key(user.pk)])
+    coupon_cache.clear()
+
+
+def measure(client, endpoint, iterations, cold=None):
+    """
+    Request ``endpoint`` once on cold caches (``cold()`` drops them), then
+    ``iterations`` times warm. Every request runs in a transaction that is
+    rolled back, so writes (add to cart, remove) see the same starting
+    state each time and the database is left untouched.
+    """
+    timings, sql_timings, query_counts, status = [], [], [], None
+    cold_queries = 0
+    request = getattr(client, endpoint.method)
+    for run in range(iterations + 1):
+        if run == 0 and cold:
+            cold()
+        recorder = QueryRecorder()
+        with transaction.atomic():
+            with connection.execute_wrapper(recorder):
+                started = time.perf_counter()
+                response = request(endpoint.path, endpoint.data, **endpoint.headers)
+                elapsed = (time.perf_counter() - started) * 1000
+            transaction.set_rollback(True)
+        status = response.status_code
+        if run == 0:
+            # cache-miss builders only run here; budgeted on their own
+            cold_queries = recorder.count
+            continue
+        timings.append(elapsed)
+        query_counts.append(recorder.count)
+        sql_timings.append(recorder.seconds * 1000)
+    return EndpointResult(
+        name=endpoint.name,
+        status=status,
+        # the worst warm run; misses are counted in cold_queries
+        queries=max(query_counts),
+        cold_queries=cold_queries,
+        p50_ms=percentile(timings, 0.5),
+        p95_ms=percentile(timings, 0.95),
+        sql_ms=percentile(sql_timings, 0.5),
+    )
+
+
+def run_benchmark(user, product=None, iterations=20, only=None):
+    product = product or pick_product()
+    if product is None:
+        raise ValueError("No active product with variants; generate a catalog first.")
+
+    client = Client()
+    client.force_login(user)
+    # an open cart line for the quantity and remove endpoints
+    with transaction.atomic():
+        client.post(reverse('add-to-cart'), {
+            'product_slug': product.slug, 'product_id': product.id, 'quantity': 1,
+            'variant_id': product.variants.filter(status='active', available_stock__gt=0)
+                .values_list('id', flat=True).first() or '',
+        })
+        cart_id = Cart.objects.filter(user=user, product=product, paid=False).values_list('id', flat=True).first()
+        results = [
+            measure(client, endpoint, iterations, cold=lambda: drop_caches(user, product))
+            for endpoint in build_endpoints(product, cart_id)
+            if not only or endpoint.name in only
+        ]
+        transaction.set_rollback(True)
+    return results
+
+
+# =========================================================
+# BUDGETS
+# =========================================================
+def load_budgets(path=BUDGET_FILE):
+    with open(path) as budget_file:
+        return json.load(budget_file)
+
+
+def check_budgets(results, budgets, latency=True):
+    """
+    Budget violations as readable strings. A budget entry may set
+    ``queries``, ``cold_queries``, ``p95_ms`` and ``sql_ms``; latency checks can be turned off
+    where timings are not representative (CI, debug builds).
+    """
+    keys = ('queries', 'cold_queries', 'p95_ms', 'sql_ms') if latency else ('queries', 'cold_queries')
+    violations = []
+    for result in results:
+        if result.status >= 400:
+            violations.append(f"{result.name}: HTTP {result.status}")
+        budget = budgets.get(result.name)
+        if budget is None:
+            violations.append(f"{result.name}: no budget configured")
+            continue
+        for key in keys:
+            if key in budget and getattr(result, key) > budget[key]:
+                violations.append(f"{result.name}: {key} {getattr(result, key):.0f} > budget {budget[key]}")
+    return violations
@@ -0,0 +1,80 @@
+import time
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from store.metrics import record_cache
+
+# =========================================================
+# PROCESS-LOCAL CACHE
+# =========================================================
+# A LocMemCache is private to its process: a version bump in one worker is
+# never seen by the others. There every timeout is capped, and the version
+# keys expire too (re-seeded from the clock), so nothing a worker caches can
+# be more than LOCAL_CACHE_MAX_AGE seconds stale. Shared backends keep the
+# full timeouts.
+PROCESS_LOCAL_CACHE = isinstance(caches['default'], LocMemCache)
+LOCAL_CACHE_MAX_AGE = getattr(settings, 'LOCAL_CACHE_MAX_AGE', 60)
+
+
+def cache_timeout(timeout):
+    if not PROCESS_LOCAL_CACHE:
+        return timeout
+    return LOCAL_CACHE_MAX_AGE if timeout is None else min(timeout, LOCAL_CACHE_MAX_AGE)
+
+
+# =========================================================
+# CATALOG VERSION
+# =========================================================
+# Every catalog cache key embeds the current catalog version, so bumping the
+# version invalidates all of them at once without having to know the keys.
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+_MISSING = object()
+
+
+def get_version(key) -> int:
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a version lost to eviction never goes back
+        # to a number that older cached payloads were stored under.
+        cache.add(key, int(time.time() * 1000), cache_timeout(None))
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key) -> int:
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return get_version(key)
+
+
+def get_catalog_version() -> int:
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version() -> int:
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def catalog_key(name: str, *parts) -> str:
+    suffix = ':'.join(str(part) for part in parts)
+    key = f"catalog:v{get_catalog_version()}:{name}"
+    return f"{key}:{suffix}" if suffix else key
+
+
+def cache_name(key: str) -> str:
+    # metric label: "catalog:v12:home:sliders" -> "home", "variant_matrix:7" -> "variant_matrix"
+    parts = key.split(':')
+    return parts[2] if parts[0] == 'catalog' and len(parts) > 2 else parts[0]
+
+
+def get_or_build(key: str, builder, timeout=CATALOG_CACHE_TIMEOUT):
+    # ``timeout`` may be a callable deriving the expiry from the built value
+    value = cache.get(key, _MISSING)
+    record_cache(cache_name(key), value is not _MISSING)
+    if value is _MISSING:
+        value = builder()
+        cache.set(key, value, cache_timeout(timeout(value) if callable(timeout) else timeout))
+    return value
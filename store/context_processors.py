@@ -1,27 +1,63 @@
 # store/context_processors.py
 from store.models import Category, Product, Brand
+from store.cache import catalog_key, get_or_build
+from store.utilities import lazy_context
 from django.db.models import Max, Min
 
-def store_context(request):
-    categories = Category.objects.filter(parent=None, status='active').prefetch_related(
-        'children',
-        'children__children'
-    )
-    cat_ids = Product.objects.values_list('category__id', flat=True).distinct()
-    cats = Category.objects.filter(id__in=cat_ids, status='active')
-    cates = cats.filter(is_featured=True)[:3]
+
+def build_category_tree(categories):
+    # categories ordered by materialized path: a parent always precedes its
+    # children, so the tree of any depth is assembled in a single pass
+    roots = []
+    nodes = {}
+    for category in categories:
+        category.tree_children = []
+        nodes[category.pk] = category
+        if category.parent_id is None:
+            roots.append(category)
+        elif category.parent_id in nodes:
+            nodes[category.parent_id].tree_children.append(category)
+    return roots
+
+
+def build_store_context():
+    active_categories = list(Category.objects.filter(status='active').order_by('path'))
+    categories = build_category_tree(active_categories)
+
+    # categories with products, directly or in a sub category (the filters
+    # include descendants); ancestors are read straight off the path
+    cat_ids = set(Product.objects.values_list('category__id', flat=True).distinct())
+    with_products = {
+        int(ancestor)
+        for category in active_categories if category.pk in cat_ids
+        for ancestor in category.path.split('/') if ancestor
+    }
+    cats = sorted((category for category in active_categories if category.pk in with_products), key=lambda c: c.pk)
+    cates = [cat for cat in cats if cat.is_featured][:3]
 
     brand_ids = Product.objects.values_list('brand__id', flat=True).distinct()
-    brands = Brand.objects.filter(id__in=brand_ids, status='active', is_featured=True)
+    brands = list(Brand.objects.filter(id__in=brand_ids, status='active', is_featured=True))
 
-    max_price = Product.objects.aggregate(Max('sale_price'))['sale_price__max']
-    min_price = Product.objects.aggregate(Min('sale_price'))['sale_price__min']
+    prices = Product.objects.aggregate(max_price=Max('sale_price'), min_price=Min('sale_price'))
 
     return {
         'categories': categories,
         'cats': cats,
         'cates': cates,
         'brands': brands,
-        'max_price': max_price,
-        'min_price': min_price
+        'max_price': prices['max_price'],
+        'min_price': prices['min_price']
     }
+
+
+STORE_CONTEXT_KEYS = ('categories', 'cats', 'cates', 'brands', 'max_price', 'min_price')
+
+
+def store_context(request):
+    # Built once per catalog version (see store.cache) and only when a
+    # template reads one of the keys, so AJAX fragments pay nothing.
+    return lazy_context(
+        request, 'store_context',
+        lambda: get_or_build(catalog_key('store_context'), build_store_context),
+        STORE_CONTEXT_KEYS
+    )
@@ -0,0 +1,184 @@
+import threading
+from bisect import bisect_right
+from decimal import Decimal, InvalidOperation
+from store.cache import get_catalog_version
+from store.metrics import record_cache
+
+PRICE_BUCKETS = 8
+
+
+# =========================================================
+# FACET INDEX
+# =========================================================
+def positions_mask(positions, size):
+    # building the int from bytes keeps this linear in the catalog size
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class FacetIndex:
+    """
+    In-memory filter index over listable products (active, in stock).
+
+    Every product gets a position in id order and each facet value is a
+    bitset (a Python int) of positions, so a filter combination is a few
+    ANDs and a facet count is ``int.bit_count``. Price filters use prefix
+    masks over price quantiles plus a short scan of the boundary bucket.
+    A category mask covers its whole subtree (see Category.path).
+    """
+    def __init__(self, rows, version=None, category_paths=None):
+        self.version = version
+        self.ids = []
+        category_positions = {}
+        brand_positions = {}
+
+        priced = []
+        for position, (product_id, category_id, brand_id, price) in enumerate(rows):
+            self.ids.append(product_id)
+            category_positions.setdefault(category_id, []).append(position)
+            brand_positions.setdefault(brand_id, []).append(position)
+            priced.append((price, position))
+
+        size = len(self.ids)
+        self.all_mask = (1 << size) - 1
+        self.category_masks = self._subtree_masks(
+            {key: positions_mask(positions, size) for key, positions in category_positions.items()},
+            category_paths or {}
+        )
+        self.brand_masks = {key: positions_mask(positions, size) for key, positions in brand_positions.items()}
+
+        # sorted prices with a cumulative mask at every bucket edge
+        priced.sort()
+        self.prices = [price for price, _ in priced]
+        self.price_positions = [position for _, position in priced]
+        step = max(1, -(-size // PRICE_BUCKETS))
+        self.bucket_edges = []
+        self.bucket_masks = []
+        bits = bytearray((size + 7) // 8)
+        start = 0
+        while start < size:
+            # an edge never splits a run of equal prices: every product at a
+            # bucket's max price is in that bucket
+            end = bisect_right(self.prices, self.prices[min(start + step, size) - 1])
+            for position in self.price_positions[start:end]:
+                bits[position >> 3] |= 1 << (position & 7)
+            self.bucket_edges.append(end)
+            self.bucket_masks.append(int.from_bytes(bits, 'little'))
+            start = end
+
+    @staticmethod
+    def _subtree_masks(masks, category_paths):
+        # OR every category's own products into each of its ancestors
+        subtree = {}
+        for key, mask in masks.items():
+            path = category_paths.get(key)
+            ancestors = [int(ancestor) for ancestor in path.split('/') if ancestor] if path else [key]
+            for ancestor in ancestors:
+                subtree[ancestor] = subtree.get(ancestor, 0) | mask
+        return subtree
+
+    @classmethod
+    def build(cls, version=None):
+        from store.models import Product, Category
+        rows = Product.objects.filter(status='active', available_stock__gt=0) \
+            .order_by('id').values_list('id', 'category_id', 'brand_id', 'sale_price')
+        category_paths = dict(Category.objects.values_list('id', 'path'))
+        return cls(rows.iterator(chunk_size=5000), version, category_paths)
+
+    # ---------------------------------------------------------
+    # MASKS
+    # ---------------------------------------------------------
+    def _union(self, masks, keys):
+        mask = 0
+        for key in keys:
+            mask |= masks.get(key, 0)
+        return mask
+
+    def price_mask(self, max_price):
+        if max_price is None:
+            return self.all_mask
+        cutoff = bisect_right(self.prices, max_price)
+        if cutoff == 0:
+            return 0
+        bucket = next(i for i, edge in enumerate(self.bucket_edges) if edge >= cutoff)
+        if self.bucket_edges[bucket] == cutoff:
+            return self.bucket_masks[bucket]
+        mask = self.bucket_masks[bucket - 1] if bucket else 0
+        start = self.bucket_edges[bucket - 1] if bucket else 0
+        return mask | positions_mask(self.price_positions[start:cutoff], len(self.ids))
+
+    def _masks(self, category_ids, brand_ids, max_price):
+        category = self._union(self.category_masks, category_ids) if category_ids else self.all_mask
+        brand = self._union(self.brand_masks, brand_ids) if brand_ids else self.all_mask
+        return category, brand, self.price_mask(max_price)
+
+    # ---------------------------------------------------------
+    # QUERIES
+    # ---------------------------------------------------------
+    def filter(self, category_ids=(), brand_ids=(), max_price=None):
+        category, brand, price = self._masks(category_ids, brand_ids, max_price)
+        return category & brand & price
+
+    def page(self, mask, page_number, per_page):
+        # ids of the requested page, in id order
+        bits = bin(mask)[:1:-1]
+        skip = (page_number - 1) * per_page
+        ids = []
+        position = bits.find('1')
+        while position != -1 and len(ids) < per_page:
+            if skip:
+                skip -= 1
+            else:
+                ids.append(self.ids[position])
+            position = bits.find('1', position + 1)
+        return ids
+
+    def facet_counts(self, category_ids=(), brand_ids=(), max_price=None):
+        # disjunctive counts: each facet ignores its own selection
+        category, brand, price = self._masks(category_ids, brand_ids, max_price)
+        counts = {
+            'category': {key: (mask & brand & price).bit_count() for key, mask in self.category_masks.items()},
+            'brand': {key: (mask & category & price).bit_count() for key, mask in self.brand_masks.items()},
+            'price': [],
+        }
+        selected = category & brand
+        previous = 0
+        for edge, mask in zip(self.bucket_edges, self.bucket_masks):
+            count = (mask & ~previous & selected).bit_count()
+            previous = mask
+            counts['price'].append({'max': str(self.prices[edge - 1]), 'count': count})
+        return counts
+
+
+# =========================================================
+# PROCESS-WIDE INDEX
+# =========================================================
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_facet_index():
+    # rebuilt lazily after a catalog version bump (see store.cache)
+    global _index
+    version = get_catalog_version()
+    index = _index
+    record_cache('facet_index', index is not None and index.version == version)
+    if index is None or index.version != version:
+        with _index_lock:
+            if _index is None or _index.version != version:
+                _index = FacetIndex.build(version)
+            index = _index
+    return index
+
+
+def parse_price(value):
+    try:
+        return Decimal(value) if value not in (None, '') else None
+    except InvalidOperation:
+        return None
+
+
+def parse_ids(values):
+    return [int(value) for value in values if str(value).isdigit()]
@@ -0,0 +1,92 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from store.cache import catalog_key, get_or_build
+
+# =========================================================
+# HOME PAGE SECTIONS
+# =========================================================
+# Each section of the home page is cached on its own under the catalog
+# version, so a product change rebuilds everything while a slider or
+# payment banner edit only drops its own section. Ratings on cached product
+# cards are refreshed by the section timeout.
+HOME_SECTION_TIMEOUT = 60 * 10
+HOME_SECTIONS = ('sliders', 'top_deals', 'featured', 'promotions')
+
+
+def home_key(section):
+    return catalog_key('home', section)
+
+
+def build_sliders():
+    from store.models import Slider
+    sliders = list(Slider.objects.filter(status='active', slider_type__in=['slider', 'feature', 'add'])
+                   .select_related('product'))
+    feature_sliders = [slider for slider in sliders if slider.slider_type == 'feature']
+    return {
+        'sliders': [slider for slider in sliders if slider.slider_type in ('slider', 'feature')],
+        'feature_sliders': feature_sliders[:4],
+        'add_sliders': [slider for slider in sliders if slider.slider_type == 'add'][:2],
+    }
+
+
+def build_top_deals():
+    from store.models import Product
+    top_deals = list(
+        Product.objects.filter(
+            status='active',
+            discount_percent__gt=0,
+            is_deadline=True,
+            deadline__gte=timezone.now(),
+            available_stock__gt=0
+        ).order_by('-discount_percent', 'deadline')[:6]
+    )
+    return {'top_deals': top_deals, 'first_top_deal': top_deals[0] if top_deals else None}
+
+
+def top_deals_timeout(section):
+    # expire with the first deal whose countdown runs out
+    deadlines = [product.deadline for product in section['top_deals'] if product.deadline]
+    if not deadlines:
+        return HOME_SECTION_TIMEOUT
+    remaining = (min(deadlines) - timezone.now()).total_seconds()
+    return max(1, min(HOME_SECTION_TIMEOUT, int(remaining)))
+
+
+def build_featured():
+    from store.models import Product
+    return {'featured_products': list(Product.objects.filter(
+        status='active',
+        is_featured=True,
+        available_stock__gt=0
+    )[:5])}
+
+
+def build_promotions():
+    from store.models import Slider, AcceptancePayment
+    return {
+        'promo_sliders': list(Slider.objects.filter(status='active', slider_type='promotion')
+                              .select_related('product')[:3]),
+        'acceptance_payments': list(AcceptancePayment.objects.filter(status='active')[:4]),
+    }
+
+
+SECTION_BUILDERS = {
+    'sliders': (build_sliders, HOME_SECTION_TIMEOUT),
+    'top_deals': (build_top_deals, top_deals_timeout),
+    'featured': (build_featured, HOME_SECTION_TIMEOUT),
+    'promotions': (build_promotions, HOME_SECTION_TIMEOUT),
+}
+
+
+def get_home_context():
+    context = {}
+    for section in HOME_SECTIONS:
+        builder, timeout = SECTION_BUILDERS[section]
+        context.update(get_or_build(home_key(section), builder, timeout))
+    return context
+
+
+def invalidate_home_sections(*sections):
+    # after commit, like the catalog version bump
+    transaction.on_commit(lambda: cache.delete_many([home_key(section) for section in sections]))
@@ -0,0 +1,178 @@
+from dataclasses import dataclass
+from decimal import Decimal
+from django.db import connection, transaction
+from django.utils import timezone
+from store.cache import bump_catalog_version
+from store.models import Product, Brand, Category, ImageGallery, CATEGORY_PATH_DIGITS, assign_unique_slugs
+from store.search import reindex_products
+
+DEFAULT_COVER = Product._meta.get_field('cover_image').default
+MAX_STOCK = 10000
+PRODUCT_IMPORT_FIELDS = [
+    'category_id', 'brand_id', 'title', 'description', 'old_price', 'sale_price',
+    'discount_percent', 'available_stock', 'cover_image',
+]
+
+
+@dataclass
+class ImportStats:
+    seen: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+    images: int = 0
+
+
+# =========================================================
+# CATALOG IMPORTER
+# =========================================================
+class CatalogImporter:
+    """
+    Writes batches of normalized product rows with bulk queries only:
+
+        {'external_id', 'title', 'description', 'brand', 'category',
+         'old_price', 'discount_percent', 'available_stock', 'images'}
+
+    Brands and categories are resolved from an in-memory title map and
+    created with one bulk insert per batch. Products are matched on
+    ``external_id``, so importing the same source again updates rows instead
+    of duplicating them. bulk_create bypasses model signals, so the search
+    index is refreshed per batch and the catalog version bumped by finish().
+    """
+    def __init__(self):
+        self.stats = ImportStats()
+        self.brands = dict(Brand.objects.values_list('title', 'id'))
+        self.categories = dict(Category.objects.values_list('title', 'id'))
+
+    # ---------------------------------------------------------
+    # BRANDS / CATEGORIES
+    # ---------------------------------------------------------
+    def _resolve(self, model, known, titles):
+        missing = {title for title in titles if title not in known}
+        if missing:
+            objects = assign_unique_slugs([
+                model(title=title, keyword=title[:150], description=title[:150]) for title in sorted(missing)
+            ])
+            # ignore_conflicts: another import may have created the same title
+            model.objects.bulk_create(objects, ignore_conflicts=True)
+            created = dict(model.objects.filter(title__in=missing).values_list('title', 'id'))
+            known.update(created)
+            if model is Category:
+                # new categories are roots; their path is just their own id
+                roots = [
+                    Category(id=pk, path=f"{pk:0{CATEGORY_PATH_DIGITS}d}/", depth=0)
+                    for pk in Category.objects.filter(id__in=created.values(), path='').values_list('id', flat=True)
+                ]
+                Category.objects.bulk_update(roots, ['path', 'depth'])
+        return known
+
+    # ---------------------------------------------------------
+    # PRODUCTS
+    # ---------------------------------------------------------
+    def import_batch(self, rows):
+        self.stats.seen += len(rows)
+        with transaction.atomic():
+            brands = self._resolve(Brand, self.brands, {row['brand'] for row in rows})
+            categories = self._resolve(Category, self.categories, {row['category'] for row in rows})
+
+            existing = {
+                values['external_id']: values
+                for values in Product.objects.filter(
+                    external_id__in=[row['external_id'] for row in rows]
+                ).values('id', 'external_id', *PRODUCT_IMPORT_FIELDS)
+            }
+            # titles are unique: skip rows whose title belongs to another product
+            title_owners = dict(Product.objects.filter(
+                title__in=[row['title'] for row in rows]
+            ).values_list('title', 'external_id'))
+
+            to_create, to_update, unchanged, images = [], [], [], {}
+            now = timezone.now()
+            seen_titles = set()
+            for row in rows:
+                owner = title_owners.get(row['title'], row['external_id'])
+                if owner != row['external_id'] or row['title'] in seen_titles:
+                    self.stats.skipped += 1
+                    continue
+                seen_titles.add(row['title'])
+
+                old_price = Decimal(row['old_price']).quantize(Decimal('0.01'))
+                discount = min(max(int(row['discount_percent']), 0), 100)
+                product = Product(
+                    external_id=row['external_id'],
+                    title=row['title'],
+                    description=row['description'] or 'N/A',
+                    brand_id=brands[row['brand']],
+                    category_id=categories[row['category']],
+                    old_price=old_price,
+                    # same rule as Product.save
+                    sale_price=(old_price * (100 - discount) / 100).quantize(Decimal('0.01')),
+                    discount_percent=discount,
+                    available_stock=min(max(int(row['available_stock']), 0), MAX_STOCK),
+                )
+                images[row['external_id']] = row['images']
+                stored = existing.get(row['external_id'])
+                if stored:
+                    product.pk = stored['id']
+                    cover = stored['cover_image']
+                    product.cover_image = cover if cover != DEFAULT_COVER else (row['images'] or [DEFAULT_COVER])[0]
+                    # unchanged rows are not rewritten (bulk_update is the costly part)
+                    if any(getattr(product, field) != stored[field] for field in PRODUCT_IMPORT_FIELDS):
+                        product.updated_at = now
+                        to_update.append(product)
+                    else:
+                        unchanged.append(product)
+                else:
+                    product.cover_image = (row['images'] or [DEFAULT_COVER])[0]
+                    to_create.append(product)
+
+            assign_unique_slugs(to_create)
+            Product.objects.bulk_create(to_create)
+            if to_create and to_create[0].pk is None:
+                # backends without RETURNING: read the new ids back
+                ids = dict(Product.objects.filter(
+                    external_id__in=[product.external_id for product in to_create]
+                ).values_list('external_id', 'id'))
+                for product in to_create:
+                    product.pk = ids[product.external_id]
+            self._update_products(to_update)
+
+            self.stats.images += self._import_images(to_create + to_update + unchanged, images)
+            reindex_products([product.pk for product in to_create + to_update])
+
+        self.stats.created += len(to_create)
+        self.stats.updated += len(to_update)
+        self.stats.unchanged += len(unchanged)
+        return self.stats
+
+    def _update_products(self, products):
+        # bulk_update() builds one CASE per column over the whole batch, which
+        # is slow on SQLite; a prepared UPDATE per row through executemany is not
+        fields = [Product._meta.get_field(name) for name in PRODUCT_IMPORT_FIELDS + ['updated_at']]
+        columns = ', '.join(f"{connection.ops.quote_name(field.column)} = %s" for field in fields)
+        sql = f"UPDATE {connection.ops.quote_name(Product._meta.db_table)} SET {columns} WHERE id = %s"
+        params = [
+            [field.get_db_prep_save(getattr(product, field.attname), connection) for field in fields] + [product.pk]
+            for product in products
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+    def _import_images(self, products, images):
+        # only add gallery rows that are not there yet, so re-runs are no-ops
+        existing = set(ImageGallery.objects.filter(
+            product_id__in=[product.pk for product in products]
+        ).values_list('product_id', 'image'))
+        gallery = [
+            ImageGallery(product_id=product.pk, image=url)
+            for product in products
+            for url in images[product.external_id]
+            if (product.pk, url) not in existing
+        ]
+        ImageGallery.objects.bulk_create(gallery, batch_size=500)
+        return len(gallery)
+
+    def finish(self):
+        bump_catalog_version()
+        return self.stats
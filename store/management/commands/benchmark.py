@@ -0,0 +1,48 @@
+import json
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from store.benchmark import BUDGET_FILE, run_benchmark, load_budgets, check_budgets
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Benchmark the storefront views (latency, query count, SQL time) and check them against the budget file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--budget', default=BUDGET_FILE, help="Budget JSON file")
+        parser.add_argument('--user', help="Username to shop as (default: first active user)")
+        parser.add_argument('--endpoint', action='append', dest='endpoints', help="Only this endpoint (repeatable)")
+        parser.add_argument('--no-latency', action='store_true', help="Only enforce query budgets")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True)
+        user = users.filter(username=options['user']).first() if options['user'] else users.order_by('id').first()
+        if user is None:
+            raise CommandError("No user to shop as.")
+
+        # the test client sends Host: testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            try:
+                results = run_benchmark(user, iterations=options['iterations'], only=options['endpoints'])
+            except ValueError as error:
+                raise CommandError(error)
+
+        if options['json']:
+            self.stdout.write(json.dumps({result.name: result.as_dict() for result in results}, indent=2))
+        else:
+            self.stdout.write(f"{'endpoint':<18} {'status':>6} {'queries':>8} {'cold':>5} {'p50 ms':>9} {'p95 ms':>9} {'sql ms':>9}")
+            for result in results:
+                self.stdout.write(
+                    f"{result.name:<18} {result.status:>6} {result.queries:>8} {result.cold_queries:>5} "
+                    f"{result.p50_ms:>9.1f} {result.p95_ms:>9.1f} {result.sql_ms:>9.1f}"
+                )
+
+        violations = check_budgets(results, load_budgets(options['budget']), latency=not options['no_latency'])
+        if violations:
+            raise CommandError("Budget exceeded:\n  " + "\n  ".join(violations))
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} endpoint(s) within budget."))
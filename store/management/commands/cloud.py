@@ -1,55 +1,104 @@
-import requests
-from django.core.management.base import BaseCommand
-from store.models import Product, Brand, Category, ImageGallery
+import json
+import time
 from decimal import Decimal
+from pathlib import Path
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from store.importer import CatalogImporter
+
+DEFAULT_SOURCE = 'https://dummyjson.com/products'
+
 
 class Command(BaseCommand):
-    def handle(self, *args, **kwargs):
-        response = requests.get('https://dummyjson.com/products')
-        data = response.json()
-
-        for p in data.get('products', []):  # safe fallback
-            # Safe brand
-            brand_name = p.get('brand', 'Unknown')
-            brand_obj, _ = Brand.objects.get_or_create(
-                title=brand_name,
-                defaults={
-                    "keyword": brand_name,
-                    "description": brand_name,
-                }
-            )
+    help = "Import products from a dummyjson-style source (URL or local JSON file)"
 
-            # Safe category
-            category_name = p.get('category', 'General')
-            category_obj, _ = Category.objects.get_or_create(
-                title=category_name,
-                defaults={
-                    "keyword": category_name,
-                    "description": category_name,
-                }
-            )
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=DEFAULT_SOURCE,
+                            help="Products endpoint or path to a JSON file (default: %(default)s)")
+        parser.add_argument('--page-size', type=int, default=100,
+                            help="Products requested per HTTP page (default: %(default)s)")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Products written per transaction (default: %(default)s)")
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Stop after this many source products")
+
+    # ---------------------------------------------------------
+    # SOURCE
+    # ---------------------------------------------------------
+    def fetch_pages(self, source, page_size):
+        # yields lists of raw products, one page at a time
+        path = Path(source)
+        if path.exists():
+            data = json.loads(path.read_text(encoding='utf-8'))
+            yield data.get('products', []) if isinstance(data, dict) else data
+            return
+
+        skip = 0
+        with requests.Session() as session:
+            while True:
+                try:
+                    response = session.get(source, params={'limit': page_size, 'skip': skip}, timeout=30)
+                    response.raise_for_status()
+                except requests.RequestException as exc:
+                    raise CommandError(f"Could not fetch {source}: {exc}")
+                data = response.json()
+                products = data.get('products', [])
+                if not products:
+                    return
+                yield products
+                skip += len(products)
+                if skip >= data.get('total', 0):
+                    return
+
+    def batches(self, pages, batch_size, limit):
+        batch, count = [], 0
+        for page in pages:
+            for item in page:
+                if limit is not None and count >= limit:
+                    break
+                batch.append(self.normalize(item))
+                count += 1
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if limit is not None and count >= limit:
+                break
+        if batch:
+            yield batch
+
+    def normalize(self, item):
+        price = Decimal(f"{item.get('price', 0):.2f}")
+        return {
+            'external_id': f"dummyjson:{item['id']}",
+            'title': (item.get('title') or 'No Title')[:150],
+            'description': item.get('description', ''),
+            'brand': (item.get('brand') or 'Unknown')[:150],
+            'category': (item.get('category') or 'General')[:150],
+            'old_price': price + 100,
+            'discount_percent': int(item.get('discountPercentage', 0)),
+            'available_stock': item.get('stock', 0),
+            'images': item.get('images', []),
+        }
 
-            # Safe price conversion
-            price = Decimal(f"{p.get('price', 0):.2f}")
-            old_price = Decimal(f"{(p.get('price', 0) + 100):.2f}")
-            discount = int(p.get('discountPercentage', 0))
-
-            # Create product
-            product = Product.objects.create(
-                title=p.get('title', 'No Title'),
-                description=p.get('description', ''),
-                old_price=old_price,
-                sale_price=price,
-                discount_percent=discount,
-                available_stock=p.get('stock', 0),
-                brand=brand_obj,
-                category=category_obj,
-                image=p.get('thumbnail', ''),  # URL
+    # ---------------------------------------------------------
+    # IMPORT
+    # ---------------------------------------------------------
+    def handle(self, *args, **options):
+        importer = CatalogImporter()
+        started = time.monotonic()
+        pages = self.fetch_pages(options['source'], options['page_size'])
+        for batch in self.batches(pages, options['batch_size'], options['limit']):
+            stats = importer.import_batch(batch)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{stats.seen} product(s) processed, {stats.seen / elapsed:.0f}/s "
+                f"({stats.created} created, {stats.updated} updated, {stats.unchanged} unchanged, {stats.skipped} skipped)"
             )
 
-            # Product images
-            for img_url in p.get('images', []):
-                ImageGallery.objects.create(
-                    product=product,
-                    image=img_url
-                )
+        stats = importer.finish()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats.seen} product(s) in {elapsed:.1f}s: {stats.created} created, "
+            f"{stats.updated} updated, {stats.unchanged} unchanged, {stats.skipped} skipped, "
+            f"{stats.images} image(s) added."
+        ))
@@ -0,0 +1,265 @@
+import random
+import time
+from bisect import bisect_left
+from decimal import Decimal
+from itertools import accumulate, product as combinations
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from cart.models import Cart, rebuild_cart_summaries
+from store.cache import bump_catalog_version
+from store.models import (
+    Category, Brand, Color, Size, Product, ProductVariant, ImageGallery, Review,
+    CATEGORY_PATH_DIGITS, assign_unique_slugs
+)
+from store.search import reindex_products
+
+User = get_user_model()
+
+ADJECTIVES = ['Classic', 'Modern', 'Premium', 'Vintage', 'Slim', 'Bold', 'Silk', 'Cotton', 'Smart', 'Royal',
+              'Urban', 'Bridal', 'Casual', 'Sport', 'Golden', 'Silver', 'Eco', 'Compact', 'Deluxe', 'Handmade']
+NOUNS = ['Shirt', 'T-Shirt', 'Lehenga', 'Kameez', 'Burkha', 'Necklace', 'Ring', 'Earring', 'Laptop', 'Phone',
+         'Watch', 'Bag', 'Shoe', 'Saree', 'Panjabi', 'Bracelet', 'Headphone', 'Charger', 'Jacket', 'Scarf']
+DEFAULT_SIZES = [('Extra Small', 'XS'), ('Small', 'S'), ('Medium', 'M'), ('Large', 'L'), ('Extra Large', 'XL')]
+DEFAULT_COLORS = [('Black', '#000'), ('White', '#fff'), ('Red', '#f00'), ('Blue', '#00f'), ('Green', '#0a0')]
+DEFAULT_IMAGE = 'defaults/default.jpg'
+INSERT_CHUNK = 5000
+PRODUCT_COLUMNS = (
+    'category_id', 'brand_id', 'title', 'slug', 'external_id', 'old_price', 'discount_percent', 'sale_price',
+    'available_stock', 'sold', 'rating_count', 'rating_sum', 'rating_avg', 'is_featured', 'variant',
+)
+VARIANT_COLUMNS = (
+    'product_id', 'size_id', 'color_id', 'title', 'sku', 'variant_price', 'available_stock', 'gallery_image_id',
+)
+
+
+class Command(BaseCommand):
+    help = "Generate a large synthetic catalog (products, variants, images, reviews, carts, orders) for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--variants', type=int, default=3, help="Average variants per product")
+        parser.add_argument('--images', type=int, default=3, help="Gallery images per product")
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--reviews', type=int, default=None, help="Total reviews (default: 5 per product)")
+        parser.add_argument('--carts', type=int, default=None, help="Open cart lines (default: 1 per product)")
+        parser.add_argument('--orders', type=int, default=None, help="Paid cart lines (default: 2 per product)")
+        parser.add_argument('--brands', type=int, default=200)
+        parser.add_argument('--categories', type=int, nargs=3, default=[10, 5, 4], metavar=('ROOTS', 'CHILDREN', 'LEAVES'),
+                            help="Category tree fan-out per level (default: 10 5 4)")
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help="Zipf exponent for product popularity (0 = uniform)")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--prefix', default='gen', help="Tag for generated titles, usernames and SKUs")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        if Product.objects.filter(external_id__startswith=f"{self.prefix}:").exists():
+            raise CommandError(f"Products tagged '{self.prefix}' already exist, pass another --prefix.")
+
+        count = options['products']
+        self.started = time.monotonic()
+        users = self.create_users(options['users'])
+        leaves = self.create_categories(*options['categories'])
+        brands = self.create_brands(options['brands'])
+        sizes, colors = self.ensure_options()
+
+        # popularity: zipf weights over a shuffled rank, so ids carry no signal
+        ranks = list(range(1, count + 1))
+        self.rng.shuffle(ranks)
+        weights = [1 / rank ** options['skew'] for rank in ranks]
+        total_weight = sum(weights)
+        brand_weights = list(accumulate(1 / (rank + 1) ** options['skew'] for rank in range(len(brands))))
+
+        def spread(total):
+            # per-product counts proportional to popularity, capped by users
+            return [min(len(users), int(total * weight / total_weight + self.rng.random())) for weight in weights]
+
+        reviews = spread(options['reviews'] if options['reviews'] is not None else count * 5)
+        carts = spread(options['carts'] if options['carts'] is not None else count)
+        orders = spread(options['orders'] if options['orders'] is not None else count * 2)
+
+        totals = {'products': 0, 'variants': 0, 'images': 0, 'reviews': 0, 'carts': 0, 'orders': 0}
+        batch_size = options['batch_size']
+        for start in range(0, count, batch_size):
+            numbers = range(start, min(start + batch_size, count))
+            with transaction.atomic():
+                written = self.create_batch(
+                    numbers, users, leaves, brands, brand_weights, sizes, colors,
+                    options['variants'], options['images'], reviews, carts, orders
+                )
+            for key, value in written.items():
+                totals[key] += value
+            self.progress(totals)
+
+        reindex_products()
+        rebuild_cart_summaries()
+        bump_catalog_version()
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated in {elapsed:.1f}s: " + ', '.join(f"{value} {key}" for key, value in totals.items())
+        ))
+
+    def progress(self, totals):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f"{totals['products']} product(s), {totals['reviews']} review(s), "
+            f"{totals['carts'] + totals['orders']} cart line(s) - {totals['products'] / elapsed:.0f} products/s"
+        )
+
+    # ---------------------------------------------------------
+    # REFERENCE DATA
+    # ---------------------------------------------------------
+    def create_users(self, count):
+        password = make_password(None)  # unusable; hashing per user would dominate
+        users = [
+            User(username=f"{self.prefix}_user{n}", email=f"{self.prefix}_user{n}@example.com", password=password)
+            for n in range(count)
+        ]
+        User.objects.bulk_create(users, batch_size=2000)
+        return list(User.objects.filter(username__startswith=f"{self.prefix}_user").values_list('id', flat=True))
+
+    def create_categories(self, roots, children, leaves):
+        level = [None]
+        for depth, fan_out in enumerate((roots, children, leaves)):
+            categories = [
+                Category(title=f"{self.prefix.title()} {self.rng.choice(NOUNS)} {depth}-{index}-{n}",
+                         parent=parent, depth=depth)
+                for index, parent in enumerate(level) for n in range(fan_out)
+            ]
+            Category.objects.bulk_create(assign_unique_slugs(categories))
+            if categories[0].pk is None:
+                titles = [category.title for category in categories]
+                ids = dict(Category.objects.filter(title__in=titles).values_list('title', 'id'))
+                for category in categories:
+                    category.pk = ids[category.title]
+            for category in categories:
+                parent_path = category.parent.path if category.parent else ''
+                category.path = f"{parent_path}{category.pk:0{CATEGORY_PATH_DIGITS}d}/"
+            Category.objects.bulk_update(categories, ['path'], batch_size=500)
+            level = categories
+        return [category.pk for category in level]
+
+    def create_brands(self, count):
+        brands = [Brand(title=f"{self.prefix.title()} Brand {n}") for n in range(count)]
+        Brand.objects.bulk_create(assign_unique_slugs(brands))
+        return list(Brand.objects.filter(title__startswith=f"{self.prefix.title()} Brand ").values_list('id', flat=True))
+
+    def ensure_options(self):
+        if not Size.objects.exists():
+            Size.objects.bulk_create([Size(title=title, code=code) for title, code in DEFAULT_SIZES])
+        if not Color.objects.exists():
+            Color.objects.bulk_create([Color(title=title, code=code) for title, code in DEFAULT_COLORS])
+        return list(Size.objects.values_list('id', flat=True)), list(Color.objects.values_list('id', flat=True))
+
+    # ---------------------------------------------------------
+    # RAW INSERTS
+    # ---------------------------------------------------------
+    def insert_rows(self, model, columns, rows):
+        """
+        INSERT rows (tuples matching ``columns``) with executemany. Model
+        instances and per-value field preparation cost more than SQLite
+        itself at this volume; every other column gets its default once.
+        """
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        defaults = []
+        for field in model._meta.concrete_fields:
+            if field.primary_key or field.attname in columns:
+                continue
+            value = now if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False) \
+                else field.get_db_prep_save(field.get_default(), connection)
+            defaults.append((field.column, value))
+        names = [model._meta.get_field(column).column for column in columns] + [column for column, _ in defaults]
+        sql = (
+            f"INSERT INTO {connection.ops.quote_name(model._meta.db_table)} "
+            f"({', '.join(connection.ops.quote_name(name) for name in names)}) "
+            f"VALUES ({', '.join(['%s'] * len(names))})"
+        )
+        constants = tuple(value for _, value in defaults)
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), INSERT_CHUNK):
+                cursor.executemany(sql, [row + constants for row in rows[start:start + INSERT_CHUNK]])
+        return len(rows)
+
+    # ---------------------------------------------------------
+    # PRODUCTS AND EVERYTHING HANGING OFF THEM
+    # ---------------------------------------------------------
+    def create_batch(self, numbers, users, leaves, brands, brand_weights, sizes, colors,
+                     variants_avg, images_per_product, reviews, carts, orders):
+        rng = self.rng
+        tag = self.prefix.upper()
+        products, plans = [], []
+        for n in numbers:
+            # quality drives ratings; every review of a product is drawn up front
+            # so the stored aggregates match the rows inserted below
+            quality = rng.uniform(2.5, 5)
+            ratings = [min(5, max(1, round(rng.gauss(quality, 0.8)))) for _ in range(reviews[n])]
+            order_quantities = [rng.randint(1, 3) for _ in range(orders[n])]
+            old_price = Decimal(rng.randint(500, 500000))
+            discount = rng.choice((0, 0, 5, 10, 15, 20, 30, 50))
+            sale_price = (old_price * (100 - discount) / 100).quantize(Decimal('0.01'))
+            # "<prefix>-<n>" keeps titles, and so slugs, unique without a lookup
+            title = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {tag}-{n}"
+            products.append((
+                rng.choice(leaves),
+                brands[bisect_left(brand_weights, rng.random() * brand_weights[-1])],
+                title, slugify(title), f"{self.prefix}:{n}",
+                old_price, discount, sale_price,
+                rng.randint(0, 500) if rng.random() > 0.05 else 0,
+                sum(order_quantities), len(ratings), float(sum(ratings)),
+                sum(ratings) / len(ratings) if ratings else 0.0,
+                rng.random() < 0.01,
+                'color-size' if variants_avg else 'none',
+            ))
+            plans.append((n, f"{self.prefix}:{n}", sale_price, title, ratings, order_quantities))
+
+        self.insert_rows(Product, PRODUCT_COLUMNS, products)
+        product_ids = dict(Product.objects.filter(external_id__in=[plan[1] for plan in plans])
+                           .values_list('external_id', 'id'))
+
+        images = [(product_ids[plan[1]], DEFAULT_IMAGE) for plan in plans for _ in range(images_per_product)]
+        self.insert_rows(ImageGallery, ('product_id', 'image'), images)
+        product_images = {}
+        for image_id, product_id in ImageGallery.objects.filter(
+                product_id__in=product_ids.values()).values_list('id', 'product_id'):
+            product_images.setdefault(product_id, []).append(image_id)
+
+        variants, review_rows, cart_rows, order_rows = [], [], [], []
+        option_pairs = list(combinations(sizes, colors))
+        for n, external_id, sale_price, title, ratings, order_quantities in plans:
+            product_id = product_ids[external_id]
+            count = min(len(option_pairs), rng.randint(1, 2 * variants_avg - 1)) if variants_avg else 0
+            gallery = product_images.get(product_id, [None])
+            for k, (size_id, color_id) in enumerate(rng.sample(option_pairs, count)):
+                variants.append((
+                    product_id, size_id, color_id, title, f"{tag}-{product_id}-{k}",
+                    sale_price + rng.choice((0, 0, 50, 100)), rng.randint(0, 100), gallery[k % len(gallery)],
+                ))
+            review_rows.extend(
+                (product_id, user_id, float(rating), f"{rating} star review", "Generated review")
+                for user_id, rating in zip(rng.sample(users, len(ratings)), ratings)
+            )
+            # one open line per (user, product), like AddToCartView keeps it
+            cart_rows.extend(
+                (user_id, product_id, rng.randint(1, 3), sale_price, False)
+                for user_id in rng.sample(users, carts[n])
+            )
+            # orders: the checkout app is not installed, a paid cart line is the order record
+            order_rows.extend(
+                (rng.choice(users), product_id, quantity, sale_price, True) for quantity in order_quantities
+            )
+
+        cart_columns = ('user_id', 'product_id', 'quantity', 'stored_unit_price', 'paid')
+        return {
+            'products': len(products),
+            'variants': self.insert_rows(ProductVariant, VARIANT_COLUMNS, variants),
+            'images': len(images),
+            'reviews': self.insert_rows(Review, ('product_id', 'user_id', 'rating', 'subject', 'comment'), review_rows),
+            'carts': self.insert_rows(Cart, cart_columns, cart_rows),
+            'orders': self.insert_rows(Cart, cart_columns, order_rows),
+        }
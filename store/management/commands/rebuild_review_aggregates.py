@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from store.models import rebuild_review_aggregates
+
+
+class Command(BaseCommand):
+    help = "Recompute Product.rating_avg/rating_count/rating_sum from active reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', dest='product_ids',
+                            help="Only rebuild this product id (repeatable)")
+
+    def handle(self, *args, **options):
+        changed = rebuild_review_aggregates(options['product_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Review aggregates rebuilt, {changed} product(s) repaired."))
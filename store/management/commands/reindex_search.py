@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from store.search import fts_available, reindex_products
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index"
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            self.stdout.write(self.style.WARNING("Full-text index needs SQLite FTS5, nothing to do."))
+            return
+        indexed = reindex_products()
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt, {indexed} product(s) indexed."))
@@ -0,0 +1,225 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from django.conf import settings
+
+# =========================================================
+# METRICS REGISTRY
+# =========================================================
+# Counters and histograms with Prometheus semantics. Every thread writes
+# only to its own shard (a plain dict), so recording takes no lock; shards
+# are summed when the metrics are read.
+#
+# With METRICS_DIR set, each worker process also writes its totals to
+# METRICS_DIR/<pid>-<start>.json (at most every METRICS_FLUSH_INTERVAL
+# seconds), and /metrics/ adds up the files of all workers, past and present.
+METRICS_DIR = getattr(settings, 'METRICS_DIR', None)
+METRICS_FLUSH_INTERVAL = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            # once per thread
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def samples(self):
+        # {label values: value} summed over all threads of this process
+        totals = {}
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            # dict.copy() is atomic, the owning thread may be writing
+            for key, value in shard.copy().items():
+                totals[key] = self.merge(totals.get(key), value)
+        return totals
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    @staticmethod
+    def merge(total, value):
+        return (total or 0) + value
+
+    def expose(self, samples):
+        for key, value in sorted(samples.items()):
+            yield f"{self.name}{format_labels(self.labels, key)} {format_value(value)}"
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        # [per-bucket counts..., +Inf count, sum]; cumulated on exposition
+        state = shard.get(key)
+        if state is None:
+            state = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            position = len(self.buckets)
+        state[position] += 1
+        state[-1] += value
+
+    @staticmethod
+    def merge(total, value):
+        return [a + b for a, b in zip(total, value)] if total else list(value)
+
+    def expose(self, samples):
+        for key, state in sorted(samples.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), state[:-1]):
+                cumulative += count
+                labels = format_labels(self.labels + ('le',), key + (format_value(bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labels, key)} {format_value(state[-1])}"
+            yield f"{self.name}_count{format_labels(self.labels, key)} {cumulative}"
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    escaped = (
+        str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+def format_value(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    def __init__(self, directory=None):
+        self.metrics = {}
+        self.directory = directory
+        self.last_flush = 0.0
+        self._pid = None
+        self._file_name = None
+        if directory:
+            # what happened since the last periodic flush
+            atexit.register(self.flush)
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    # ---------------------------------------------------------
+    # MULTI-PROCESS FILES
+    # ---------------------------------------------------------
+    @property
+    def file_name(self):
+        # per process; a worker forked after import gets a file of its own
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._file_name = f"{self._pid}-{int(time.time() * 1000)}.json"
+        return self._file_name
+
+    def snapshot(self):
+        return {name: metric.samples() for name, metric in self.metrics.items()}
+
+    def maybe_flush(self):
+        if self.directory and time.monotonic() - self.last_flush >= METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        data = {name: [[list(key), value] for key, value in samples.items()]
+                for name, samples in self.snapshot().items()}
+        path = os.path.join(self.directory, self.file_name)
+        # write and rename, readers never see half a file
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, 'w') as metrics_file:
+            json.dump(data, metrics_file)
+        os.replace(temporary, path)
+
+    def collect(self):
+        totals = self.snapshot()
+        if not self.directory:
+            return totals
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            if os.path.basename(path) == self.file_name:
+                continue  # this process: the live values above are newer
+            try:
+                with open(path) as metrics_file:
+                    data = json.load(metrics_file)
+            except (OSError, ValueError):
+                continue
+            for name, samples in data.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                for key, value in samples:
+                    key = tuple(key)
+                    totals[name][key] = metric.merge(totals[name].get(key), value)
+        return totals
+
+    # ---------------------------------------------------------
+    # PROMETHEUS TEXT FORMAT
+    # ---------------------------------------------------------
+    def render(self):
+        lines = []
+        for name, samples in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.expose(samples))
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry(METRICS_DIR)
+
+HTTP_REQUESTS = registry.counter(
+    'http_requests_total', "HTTP requests by URL name, method and status code", ('url_name', 'method', 'status')
+)
+HTTP_REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds', "Request latency by URL name", ('url_name',)
+)
+DB_QUERIES = registry.counter('db_queries_total', "SQL queries by URL name", ('url_name',))
+CACHE_REQUESTS = registry.counter('cache_requests_total', "Cache lookups by cache and result", ('cache', 'result'))
+CART_EVENTS = registry.counter('cart_events_total', "Cart changes by action", ('action',))
+
+
+def record_cache(name, hit):
+    CACHE_REQUESTS.inc(cache=name, result='hit' if hit else 'miss')
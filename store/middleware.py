@@ -0,0 +1,148 @@
+import json
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+from django.template.context import RequestContext
+from store.metrics import registry, HTTP_REQUESTS, HTTP_REQUEST_DURATION, DB_QUERIES
+import logging
+
+logger = logging.getLogger('project.request_timing')
+
+# Share of requests written to the log; slow requests are always written
+REQUEST_TIMING_SAMPLE_RATE = getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 0.05)
+REQUEST_TIMING_SLOW_MS = getattr(settings, 'REQUEST_TIMING_SLOW_MS', 500)
+REQUEST_TIMING_HEADER = getattr(settings, 'REQUEST_TIMING_HEADER', True)
+
+
+class QueryRecorder:
+    # execute_wrapper: counts and times every query, with or without DEBUG
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+class RequestTimings:
+    def __init__(self):
+        self.queries = QueryRecorder()
+        self.template = 0.0
+        self.context_processors = 0.0
+        self.template_depth = 0
+
+
+_current = ContextVar('request_timings', default=None)
+
+
+# =========================================================
+# TEMPLATE / CONTEXT PROCESSOR HOOKS
+# =========================================================
+# Django has no signal for either, so Template.render and
+# RequestContext.bind_template are wrapped once. Outside an instrumented
+# request the wrappers only cost a ContextVar lookup.
+_original_render = Template.render
+_original_bind_template = RequestContext.bind_template
+
+
+def _timed_render(self, context):
+    timings = _current.get()
+    # {% include %} renders nested templates; only the outermost is timed
+    if timings is None or timings.template_depth:
+        return _original_render(self, context)
+    timings.template_depth += 1
+    started = time.perf_counter()
+    processors = timings.context_processors
+    try:
+        return _original_render(self, context)
+    finally:
+        timings.template_depth -= 1
+        # context processors run inside render and are reported on their own
+        timings.template += time.perf_counter() - started - (timings.context_processors - processors)
+
+
+@contextmanager
+def _timed_bind_template(self, template):
+    timings = _current.get()
+    with ExitStack() as stack:
+        started = time.perf_counter()
+        stack.enter_context(_original_bind_template(self, template))
+        if timings is not None:
+            timings.context_processors += time.perf_counter() - started
+        yield
+
+
+def install_template_timing():
+    if Template.render is not _timed_render:
+        Template.render = _timed_render
+        RequestContext.bind_template = _timed_bind_template
+
+
+# =========================================================
+# REQUEST TIMING MIDDLEWARE
+# =========================================================
+class RequestTimingMiddleware:
+    """
+    Times every request: SQL query count and time (all connections),
+    template rendering, context processors and the total. The numbers go
+    out as a ``Server-Timing`` header, readable in the browser's network
+    panel, and a sample of requests is logged as JSON tagged with the URL
+    name. Request, latency and query metrics go to store.metrics. Keep it
+    first in MIDDLEWARE so ``total`` covers the others.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_template_timing()
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(timings.queries))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+
+        record = {
+            'url_name': request.resolver_match.url_name if request.resolver_match else None,
+            'method': request.method,
+            'status': response.status_code,
+            'queries': timings.queries.count,
+            'sql_ms': round(timings.queries.seconds * 1000, 2),
+            'template_ms': round(timings.template * 1000, 2),
+            'context_processors_ms': round(timings.context_processors * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }
+        url_name = record['url_name'] or 'unmatched'
+        HTTP_REQUESTS.inc(url_name=url_name, method=request.method, status=response.status_code)
+        HTTP_REQUEST_DURATION.observe(total, url_name=url_name)
+        DB_QUERIES.inc(timings.queries.count, url_name=url_name)
+        registry.maybe_flush()
+
+        if REQUEST_TIMING_HEADER:
+            response['Server-Timing'] = server_timing_header(record)
+        if record['total_ms'] >= REQUEST_TIMING_SLOW_MS or random.random() < REQUEST_TIMING_SAMPLE_RATE:
+            logger.info('request_timing %s', json.dumps(record))
+        return response
+
+
+def server_timing_header(record):
+    return ', '.join([
+        f'db;dur={record["sql_ms"]};desc="{record["queries"]} queries"',
+        f'tpl;dur={record["template_ms"]};desc="Templates"',
+        f'cp;dur={record["context_processors_ms"]};desc="Context processors"',
+        f'total;dur={record["total_ms"]};desc="Total"',
+    ])
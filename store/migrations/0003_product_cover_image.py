@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:38
+
+from django.db import migrations, models
+
+
+def backfill_cover_image(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    ImageGallery = apps.get_model('store', 'ImageGallery')
+    covers = {}
+    for product_id, image in ImageGallery.objects.filter(status='active') \
+            .order_by('id').values_list('product_id', 'image'):
+        covers.setdefault(product_id, image)
+    for product_id, image in covers.items():
+        Product.objects.filter(pk=product_id).update(cover_image=image)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0002_product_review_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='cover_image',
+            field=models.ImageField(default='defaults/default.jpg', editable=False, upload_to='galleries/%Y/%m/%d/'),
+        ),
+        migrations.RunPython(backfill_cover_image, migrations.RunPython.noop),
+    ]
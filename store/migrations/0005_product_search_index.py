@@ -0,0 +1,33 @@
+from django.db import migrations
+
+FTS_COLUMNS = 'title, keyword, tag, short_des, description'
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite only, other backends use the fallback in store.search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS store_product_fts "
+        f"USING fts5({FTS_COLUMNS}, tokenize='porter unicode61')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO store_product_fts (rowid, {FTS_COLUMNS}) SELECT id, {FTS_COLUMNS} FROM store_product"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS store_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_image_ids(apps, schema_editor):
+    # keep only ids that point at an image of the variant's own product,
+    # matching what ProductVariant.get_image used to resolve
+    ProductVariant = apps.get_model('store', 'ProductVariant')
+    ImageGallery = apps.get_model('store', 'ImageGallery')
+    image_products = dict(ImageGallery.objects.values_list('id', 'product_id'))
+    variants = []
+    for variant in ProductVariant.objects.exclude(legacy_image_id__isnull=True).exclude(legacy_image_id=0):
+        if image_products.get(variant.legacy_image_id) == variant.product_id:
+            variant.gallery_image_id = variant.legacy_image_id
+            variants.append(variant)
+    ProductVariant.objects.bulk_update(variants, ['gallery_image'], batch_size=500)
+
+
+def copy_gallery_image_ids(apps, schema_editor):
+    ProductVariant = apps.get_model('store', 'ProductVariant')
+    ProductVariant.objects.update(legacy_image_id=models.F('gallery_image_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_product_search_index'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='productvariant',
+            old_name='image_id',
+            new_name='legacy_image_id',
+        ),
+        migrations.AddField(
+            model_name='productvariant',
+            name='gallery_image',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='variants', to='store.imagegallery'),
+        ),
+        migrations.RunPython(copy_image_ids, copy_gallery_image_ids),
+        migrations.RemoveField(
+            model_name='productvariant',
+            name='legacy_image_id',
+        ),
+    ]
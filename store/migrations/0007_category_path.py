@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:40
+
+from django.db import migrations, models
+
+CATEGORY_PATH_DIGITS = 8
+
+
+def backfill_paths(apps, schema_editor):
+    Category = apps.get_model('store', 'Category')
+    categories = {category.pk: category for category in Category.objects.all()}
+    children = {}
+    for category in categories.values():
+        children.setdefault(category.parent_id, []).append(category)
+
+    # breadth-first from the roots, so a parent's path is always known
+    level = [(category, '') for category in children.get(None, [])]
+    while level:
+        next_level = []
+        for category, parent_path in level:
+            category.path = f"{parent_path}{category.pk:0{CATEGORY_PATH_DIGITS}d}/"
+            category.depth = category.path.count('/') - 1
+            next_level.extend((child, category.path) for child in children.get(category.pk, []))
+        level = next_level
+    Category.objects.bulk_update(categories.values(), ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_productvariant_gallery_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
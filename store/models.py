@@ -1,13 +1,22 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
 from django.utils.text import slugify
 from django.utils.html import mark_safe
-from django.core.exceptions import ValidationError
+from django.core.exceptions import FieldDoesNotExist, ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from django.db.models import Avg, Sum
+from django.db.models.functions import Concat, Substr
+from django.db.models import Exists, OuterRef, Q, Count, Sum, F, Case, When, Value, FloatField, ExpressionWrapper
+from django.db.models.lookups import GreaterThan, StartsWith
 from decimal import Decimal
 from store.validators import validate_image_size
+from store.cache import bump_catalog_version, get_catalog_version
+from store.autocomplete import apply_catalog_change
+from store.search import FTS_COLUMNS, index_product, unindex_product
+from store.home import invalidate_home_sections
+from store.variants import invalidate_variant_matrix
 
 User = get_user_model()
 
@@ -36,24 +45,120 @@ SLIDER_TYPE_CHOICES = (
 # =========================================================
 # SLUG GENERATOR
 # =========================================================
-def generate_unique_slug(cls, title: str) -> str:
-    base_slug = slugify(title)
-    slug = base_slug
-    counter = 1
-    while cls.objects.filter(slug=slug).exists():
-        slug = f"{base_slug}-{counter}"
-        counter += 1
+SLUG_SAVE_ATTEMPTS = 3
+
+
+def _base_slug(cls, title):
+    # leave room for a "-<n>" suffix within the field's max_length
+    max_length = cls._meta.get_field('slug').max_length - 8
+    return slugify(title)[:max_length].strip('-') or cls._meta.model_name
+
+
+def _taken_slugs(cls, bases):
+    # one query: every slug equal to a base or starting with "<base>-"
+    query = Q()
+    for base in bases:
+        query |= Q(slug=base) | Q(slug__startswith=f"{base}-")
+    return set(cls.objects.filter(query).values_list('slug', flat=True)) if query else set()
+
+
+def _next_free_slug(base, taken):
+    # the lowest free "-<n>": a title ending in a number ("iphone-15") is
+    # not a counter, so the highest suffix in use says nothing
+    slug, counter = base, 1
+    while slug in taken:
+        slug, counter = f"{base}-{counter}", counter + 1
     return slug
 
+
+def generate_unique_slug(cls, title: str) -> str:
+    base_slug = _base_slug(cls, title)
+    return _next_free_slug(base_slug, _taken_slugs(cls, [base_slug]))
+
+
+def assign_unique_slugs(objects, chunk_size=200):
+    """
+    Give every object without a slug a unique one, with one prefix query per
+    model and chunk instead of one save-time lookup per object. Meant for
+    imports that bulk_create new Category/Brand/Product rows.
+    """
+    pending = {}
+    for obj in objects:
+        if not obj.slug:
+            pending.setdefault(type(obj), []).append(obj)
+    for cls, instances in pending.items():
+        # slugs handed out in earlier chunks are not in the table yet, so
+        # both sets live across chunks
+        taken, scanned = set(), set()
+        for start in range(0, len(instances), chunk_size):
+            chunk = instances[start:start + chunk_size]
+            bases = [_base_slug(cls, obj.title) for obj in chunk]
+            # every base is scanned: a free "<base>" can still have
+            # "<base>-<n>" rows a later duplicate must not reuse
+            new_bases = set(bases) - scanned
+            taken |= _taken_slugs(cls, new_bases)
+            scanned |= new_bases
+            for obj, base in zip(chunk, bases):
+                obj.slug = _next_free_slug(base, taken)
+                taken.add(obj.slug)
+    return objects
+
+
+class UniqueSlugMixin:
+    """
+    Allocates ``slug`` from ``title`` on first save. Two concurrent inserts
+    can pick the same free suffix; the loser's unique violation is retried
+    with a fresh allocation inside a savepoint.
+    """
+    def save(self, *args, **kwargs):
+        if self.slug:
+            return super().save(*args, **kwargs)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'slug'}
+        for attempt in range(SLUG_SAVE_ATTEMPTS):
+            self.slug = generate_unique_slug(type(self), self.title)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                taken = type(self).objects.filter(slug=self.slug).exists()
+                self.slug = None
+                if not taken or attempt == SLUG_SAVE_ATTEMPTS - 1:
+                    raise
+
+# =========================================================
+# LOADED RELATIONS VALIDATION MIXIN
+# =========================================================
+class LoadedRelationsValidationMixin:
+    """
+    full_clean() checks every foreign key with a SELECT on the related table.
+    When the related instance is already loaded on this object (assigned,
+    select_related, or fetched earlier) and matches the stored id, the row
+    is known to exist, so that lookup is skipped. Business rules in clean()
+    still run, and use the same loaded instances.
+    """
+    def clean_fields(self, exclude=None):
+        exclude = set(exclude or ())
+        for field in self._meta.concrete_fields:
+            if not field.many_to_one or field.name in exclude or not field.is_cached(self):
+                continue
+            related = field.get_cached_value(self)
+            if related is not None and not related._state.adding and related.pk == getattr(self, field.attname):
+                exclude.add(field.name)
+        super().clean_fields(exclude=exclude)
+
+
 # =========================================================
 # IMAGE TAG MIXIN
 # =========================================================
 class ImageTagMixin(models.Model):
+    image_field = 'image'
+
     class Meta:
         abstract = True
 
     def image_tag(self):
-        img = getattr(self, 'image', None)
+        img = getattr(self, self.image_field, None)
         if img and hasattr(img, 'url'):
             return mark_safe(f'<img src="{img.url}" style="max-width:50px; max-height:50px;" />')
         return mark_safe('<span>No Image</span>')
@@ -61,7 +166,10 @@ class ImageTagMixin(models.Model):
 # =========================================================
 # 01. CATEGORY MODEL
 # =========================================================
-class Category(ImageTagMixin):
+CATEGORY_PATH_DIGITS = 8
+
+
+class Category(LoadedRelationsValidationMixin, UniqueSlugMixin, ImageTagMixin):
     parent = models.ForeignKey('self', related_name='children', on_delete=models.CASCADE,
                                null=True, blank=True)
     title = models.CharField(max_length=150, unique=True)
@@ -73,6 +181,10 @@ class Category(ImageTagMixin):
                               validators=[validate_image_size])
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
     is_featured = models.BooleanField(default=False)
+    # materialized path: zero-padded ids of the ancestors and self, e.g.
+    # "00000003/00000012/", so a subtree is one "path LIKE prefix%" scan
+    path = models.CharField(max_length=255, default='', editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -80,11 +192,69 @@ class Category(ImageTagMixin):
         ordering = ['id']
         verbose_name_plural = '01. Categories'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_parent_id = instance.__dict__.get('parent_id')
+        return instance
+
+    def _parent_changed(self):
+        # instances not loaded from the database count as changed
+        return self._state.adding or self.parent_id != getattr(self, '_loaded_parent_id', -1)
+
+    def _stored_paths(self):
+        # the parent's and our own path as stored now: loaded instances go
+        # stale when another category of the tree is moved
+        paths = dict(Category.objects.filter(pk__in=[self.parent_id, self.pk]).values_list('pk', 'path'))
+        return paths.get(self.parent_id, ''), paths.get(self.pk, '')
+
+    def clean(self):
+        if self.parent_id and self.pk and self._parent_changed():
+            parent_path, path = self._stored_paths()
+            if self.parent_id == self.pk or (path and parent_path.startswith(path)):
+                raise ValidationError({'parent': "A category cannot be moved under itself or one of its sub categories."})
+
     def save(self, *args, **kwargs):
-        self.full_clean()
-        if not self.slug:
-            self.slug = generate_unique_slug(Category, self.title)
-        super().save(*args, **kwargs)
+        if not self._state.adding and not kwargs.get('force_insert'):
+            # path and depth are only written by _update_path: the loaded
+            # values may be stale after a move elsewhere in the tree
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+            kwargs['update_fields'] = [name for name in update_fields if name not in ('path', 'depth')]
+        with transaction.atomic():
+            self.full_clean()
+            super().save(*args, **kwargs)
+            self._update_path()
+
+    def _update_path(self):
+        # the path embeds our own id, so it can only be set after the insert
+        if self.path and not self._parent_changed():
+            return
+        parent_path, old_path = self._stored_paths()
+        self._loaded_parent_id = self.parent_id
+        path = f"{parent_path}{self.pk:0{CATEGORY_PATH_DIGITS}d}/"
+        old_depth = old_path.count('/') - 1 if old_path else 0
+        self.path, self.depth = path, path.count('/') - 1
+        if path == old_path:
+            return
+        Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+        if old_path:
+            # moved: rewrite the prefix of every descendant in one UPDATE
+            Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(Value(path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (self.depth - old_depth),
+            )
+
+    def get_descendants(self, include_self=False):
+        descendants = Category.objects.filter(path__startswith=self.path)
+        return descendants if include_self else descendants.exclude(pk=self.pk)
+
+    @staticmethod
+    def subtree_ids(category_ids):
+        # ids of the given categories and all their descendants, one query
+        roots = Category.objects.filter(pk__in=category_ids).filter(StartsWith(OuterRef('path'), F('path')))
+        return list(Category.objects.filter(Exists(roots)).values_list('id', flat=True))
 
     def __str__(self):
         return f"{self.title} ({self.get_status_display()})"
@@ -92,7 +262,7 @@ class Category(ImageTagMixin):
 # =========================================================
 # 02. BRAND MODEL
 # =========================================================
-class Brand(ImageTagMixin):
+class Brand(UniqueSlugMixin, ImageTagMixin):
     title = models.CharField(max_length=150, unique=True)
     slug = models.SlugField(max_length=150, unique=True, blank=True, null=True)
     keyword = models.CharField(max_length=150, default='N/A')
@@ -111,8 +281,6 @@ class Brand(ImageTagMixin):
 
     def save(self, *args, **kwargs):
         self.full_clean()
-        if not self.slug:
-            self.slug = generate_unique_slug(Brand, self.title)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -163,7 +331,7 @@ class Size(ImageTagMixin):
 # =========================================================
 # 05 PRODUCT MODEL
 # =========================================================
-class Product(ImageTagMixin):
+class Product(LoadedRelationsValidationMixin, UniqueSlugMixin, ImageTagMixin):
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE)
     brand = models.ForeignKey(Brand, related_name='products', on_delete=models.CASCADE)
     variant = models.CharField(max_length=150, choices=VARIANTS_TYPE_CHOICES, default='none')
@@ -177,6 +345,11 @@ class Product(ImageTagMixin):
     available_stock = models.PositiveIntegerField(validators=[MaxValueValidator(10000)], default=1)
     sold = models.PositiveIntegerField(default=0)
 
+    # Active review aggregates, maintained by the Review signals below
+    rating_avg = models.FloatField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.FloatField(default=0, editable=False)
+
     prev_des = models.TextField(default='N/A')
     add_des = models.TextField(default='N/A')
     short_des = models.TextField(default='N/A')
@@ -185,27 +358,106 @@ class Product(ImageTagMixin):
     description = models.TextField(default='N/A')
     tag = models.CharField(max_length=150, default='N/A')
 
+    # First active gallery image, maintained by the ImageGallery signals below
+    cover_image = models.ImageField(upload_to='galleries/%Y/%m/%d/',
+                                    default='defaults/default.jpg',
+                                    editable=False)
+
     deadline = models.DateTimeField(blank=True, null=True)
     is_deadline = models.BooleanField(default=False)
     is_featured = models.BooleanField(default=False)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    # "<source>:<id>" of imported products, so re-running an import updates them
+    external_id = models.CharField(max_length=100, unique=True, blank=True, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    image_field = 'cover_image'
+
     class Meta:
         ordering = ['id']
         verbose_name_plural = '05. Products'
+        indexes = [
+            # keyset pagination keys used by ShopView sorts
+            models.Index(fields=['created_at', 'id'], name='product_created_keyset_idx'),
+            models.Index(fields=['deadline', 'id'], name='product_deadline_keyset_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded_values()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return
+        current = self._current_values()
+        if fields is not None:
+            # only the reloaded columns match the row again; unsaved edits to
+            # the others (e.g. before a deferred field is loaded) stay dirty
+            reloaded = set()
+            for name in fields:
+                try:
+                    field = self._meta.get_field(name)
+                except FieldDoesNotExist:
+                    continue
+                if field.concrete:
+                    reloaded.add(field.attname)
+            current = {attname: value for attname, value in current.items() if attname in reloaded}
+        loaded.update(current)
+
+    def _current_values(self):
+        deferred = self.get_deferred_fields()
+        return {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields if field.attname not in deferred
+        }
+
+    def _remember_loaded_values(self):
+        # snapshot of the row as loaded, to tell which fields were changed
+        self._loaded_values = self._current_values()
+
+    def get_dirty_fields(self):
+        # None when nothing is known about the stored row (new or hand-built instance)
+        loaded = getattr(self, '_loaded_values', None)
+        if self._state.adding or loaded is None:
+            return None
+        return {
+            attname for attname, value in self._current_values().items()
+            if attname not in loaded or loaded[attname] != value
+        }
 
     def save(self, *args, **kwargs):
-        old = None
-        if self.id:
-            old = Product.objects.filter(id=self.id).values('old_price', 'discount_percent').first()
-        if not old or (old['old_price'] != self.old_price or old['discount_percent'] != self.discount_percent):
+        dirty = self.get_dirty_fields()
+        if dirty is None and self.pk and not self._state.adding:
+            # unknown previous state: fall back to reading the pricing fields
+            old = Product.objects.filter(pk=self.pk).values('old_price', 'discount_percent').first()
+            reprice = not old or (old['old_price'], old['discount_percent']) != (self.old_price, self.discount_percent)
+        else:
+            reprice = dirty is None or bool(dirty & {'old_price', 'discount_percent'})
+        if reprice:
             self.sale_price = (self.old_price * (100 - self.discount_percent) / 100).quantize(Decimal('0.01'))
-        self.full_clean()
-        if not self.slug:
-            self.slug = generate_unique_slug(Product, self.title)
+
+        update_fields = kwargs.get('update_fields')
+        if dirty is not None and update_fields is None and not kwargs.get('force_insert'):
+            # write only what changed (plus the auto_now timestamp)
+            update_fields = dirty | {'updated_at'}
+        if update_fields is not None:
+            update_fields = set(update_fields) | ({'sale_price'} if reprice else set())
+            kwargs['update_fields'] = update_fields
+            # untouched columns were valid when loaded; skip their validation
+            # (and the unique/foreign key lookups that come with it)
+            self.full_clean(exclude=[
+                field.name for field in self._meta.concrete_fields
+                if field.name not in update_fields and field.attname not in update_fields
+            ])
+        else:
+            self.full_clean()
         super().save(*args, **kwargs)
+        self._remember_loaded_values()
 
     def clean(self):
         if self.deadline and self.deadline < timezone.now():
@@ -232,11 +484,11 @@ class Product(ImageTagMixin):
 
     @property
     def average_review(self):
-        return float(self.reviews.filter(status='active').aggregate(Avg('rating'))['rating__avg'] or 0)
+        return self.rating_avg
 
     @property
     def count_review(self):
-        return self.reviews.filter(status='active').count()
+        return self.rating_count
 
     def __str__(self):
         return f"{self.title} ({self.get_status_display()})"
@@ -244,12 +496,13 @@ class Product(ImageTagMixin):
 # =========================================================
 # 06 PRODUCT VARIANT MODEL
 # =========================================================
-class ProductVariant(ImageTagMixin):
+class ProductVariant(LoadedRelationsValidationMixin, ImageTagMixin):
     title = models.CharField(max_length=150, blank=True, null=True)
     product = models.ForeignKey(Product, related_name='variants', on_delete=models.CASCADE)
     color = models.ForeignKey('Color', blank=True, null=True, on_delete=models.SET_NULL)
     size = models.ForeignKey('Size', blank=True, null=True, on_delete=models.SET_NULL)
-    image_id = models.PositiveIntegerField(blank=True, null=True, default=0)
+    gallery_image = models.ForeignKey('ImageGallery', related_name='variants', blank=True, null=True,
+                                      on_delete=models.SET_NULL)
     sku = models.CharField(max_length=100, unique=True)
     variant_price = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     available_stock = models.PositiveIntegerField(default=0)
@@ -272,18 +525,16 @@ class ProductVariant(ImageTagMixin):
             raise ValidationError("This product requires a size variant.")
         if self.product.variant == 'color-size' and (not self.color or not self.size):
             raise ValidationError("This product requires both color and size.")
-
+        if self.gallery_image and self.gallery_image.product_id != self.product_id:
+            raise ValidationError({'gallery_image': "The image must belong to this product's gallery."})
 
     def get_image(self):
-        # get the associated image from the product's image gallery
-        try:
-            image = ImageGallery.objects.get(id=self.image_id, product=self.product)
-            if image:
-                return image.image
-            return None
-        except ImageGallery.DoesNotExist:
-            return None
-        
+        # every caller selects the gallery image with the variant
+        # (select_related('gallery_image')), so this normally costs no query
+        if self.gallery_image_id:
+            return self.gallery_image.image
+        return None
+
     @property
     def image_url(self):
         img = self.get_image()
@@ -313,7 +564,8 @@ class ProductVariant(ImageTagMixin):
         size = self.size.title if self.size else "No Size"
         color = self.color.title if self.color else "No Color"
         return f"({self.product.title}) - ({size} - {color})"
-    
+
+
 # =========================================================
 # 07 IMAGE GALLERY MODEL
 # =========================================================
@@ -330,6 +582,12 @@ class ImageGallery(ImageTagMixin):
         ordering = ['id']
         verbose_name_plural = '07. Image Galleries'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_product_id = instance.__dict__.get('product_id')
+        return instance
+
     def __str__(self):
         return f"{self.product.title} Image"
 
@@ -376,6 +634,20 @@ class Review(ImageTagMixin):
             models.UniqueConstraint(fields=['product', 'user'], name='unique_review')
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_rating_state()
+        return instance
+
+    def _remember_rating_state(self):
+        # what this review currently contributes to its product's aggregates
+        deferred = self.get_deferred_fields()
+        if deferred & {'product_id', 'status', 'rating'}:
+            self._rating_state = None
+        else:
+            self._rating_state = (self.product_id, self.status, self.rating)
+
     def __str__(self):
         return self.subject or f"Review by {self.user.username}"
 
@@ -401,3 +673,197 @@ class AcceptancePayment(ImageTagMixin):
 
     def __str__(self):
         return f"{self.title} ({self.get_status_display()})"
+
+
+# =========================================================
+# REVIEW AGGREGATES
+# =========================================================
+def apply_review_delta(product_id, count_delta, sum_delta):
+    # single UPDATE, safe against concurrent reviews on the same product
+    if not count_delta and not sum_delta:
+        return
+    new_count = F('rating_count') + count_delta
+    new_sum = F('rating_sum') + sum_delta
+    Product.objects.filter(pk=product_id).update(
+        rating_count=new_count,
+        rating_sum=new_sum,
+        rating_avg=Case(
+            When(GreaterThan(new_count, 0),
+                 then=ExpressionWrapper(new_sum / new_count, output_field=FloatField())),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+    )
+
+
+def rebuild_review_aggregates(product_ids=None):
+    # Recompute from the reviews table and write back only drifted rows
+    reviews = Review.objects.filter(status='active')
+    products = Product.objects.only('id', 'rating_avg', 'rating_count', 'rating_sum').order_by('id')
+    if product_ids is not None:
+        reviews = reviews.filter(product_id__in=product_ids)
+        products = products.filter(id__in=product_ids)
+
+    stats = {
+        row['product_id']: (row['count'], row['total'])
+        for row in reviews.values('product_id').annotate(count=Count('id'), total=Sum('rating')).order_by()
+    }
+
+    changed = []
+    for product in products.iterator(chunk_size=2000):
+        count, total = stats.get(product.id, (0, 0.0))
+        avg = total / count if count else 0.0
+        if (product.rating_count, product.rating_sum, product.rating_avg) != (count, total, avg):
+            product.rating_count, product.rating_sum, product.rating_avg = count, total, avg
+            changed.append(product)
+    Product.objects.bulk_update(changed, ['rating_count', 'rating_sum', 'rating_avg'], batch_size=500)
+    return len(changed)
+
+
+def _rating_contribution(status, rating):
+    return (1, rating) if status == 'active' else (0, 0.0)
+
+
+@receiver(post_save, sender=Review)
+def update_review_aggregates(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_state = None if created else getattr(instance, '_rating_state', None)
+    if not created and old_state is None:
+        # nothing known about the previous row, recount this product
+        rebuild_review_aggregates([instance.product_id])
+    else:
+        old_product_id, old_status, old_rating = old_state or (instance.product_id, None, 0.0)
+        old_count, old_sum = _rating_contribution(old_status, old_rating)
+        new_count, new_sum = _rating_contribution(instance.status, instance.rating)
+        if old_product_id != instance.product_id:
+            apply_review_delta(old_product_id, -old_count, -old_sum)
+            apply_review_delta(instance.product_id, new_count, new_sum)
+        else:
+            apply_review_delta(instance.product_id, new_count - old_count, new_sum - old_sum)
+    instance._remember_rating_state()
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_aggregates(sender, instance, **kwargs):
+    product_id, status, rating = getattr(instance, '_rating_state', None) or (
+        instance.product_id, instance.status, instance.rating)
+    count, total = _rating_contribution(status, rating)
+    apply_review_delta(product_id, -count, -total)
+
+
+# =========================================================
+# VARIANT MATRIX
+# =========================================================
+@receiver([post_save, post_delete], sender=ProductVariant)
+def invalidate_variant_matrix_for_variant(sender, instance, **kwargs):
+    invalidate_variant_matrix(instance.product_id)
+
+
+@receiver([post_save, post_delete], sender=ImageGallery)
+def invalidate_variant_matrix_for_image(sender, instance, **kwargs):
+    # runs before update_cover_image resets the loaded product id
+    product_ids = {instance.product_id, getattr(instance, '_loaded_product_id', None)}
+    invalidate_variant_matrix(*(pk for pk in product_ids if pk))
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_variant_matrix_for_product(sender, instance, **kwargs):
+    invalidate_variant_matrix(instance.pk)
+
+
+@receiver([post_save, pre_delete], sender=Size)
+@receiver([post_save, pre_delete], sender=Color)
+def invalidate_variant_matrix_for_option(sender, instance, **kwargs):
+    # pre_delete: the variants still point at the option before SET_NULL runs
+    lookup = 'size' if sender is Size else 'color'
+    product_ids = ProductVariant.objects.filter(**{lookup: instance}).values_list('product_id', flat=True).distinct()
+    invalidate_variant_matrix(*product_ids)
+
+
+# =========================================================
+# PRODUCT COVER IMAGE
+# =========================================================
+def refresh_cover_image(product_id):
+    cover = ImageGallery.objects.filter(product_id=product_id, status='active') \
+        .values_list('image', flat=True).first() or Product._meta.get_field('cover_image').default
+    changed = Product.objects.filter(pk=product_id).exclude(cover_image=cover).update(cover_image=cover)
+    if changed:
+        # the update skips the Product signals; cached cards (home sections,
+        # listings) show the cover, so they follow the catalog version
+        transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=ImageGallery)
+def update_cover_image(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old_product_id = getattr(instance, '_loaded_product_id', None)
+    if old_product_id and old_product_id != instance.product_id:
+        refresh_cover_image(old_product_id)
+    refresh_cover_image(instance.product_id)
+    instance._loaded_product_id = instance.product_id
+
+
+@receiver(post_delete, sender=ImageGallery)
+def remove_cover_image(sender, instance, **kwargs):
+    refresh_cover_image(instance.product_id)
+
+
+# =========================================================
+# CATALOG CACHE INVALIDATION
+# =========================================================
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Brand)
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    # bump after commit so a concurrent request cannot cache pre-commit data
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver([post_save, post_delete], sender=Slider)
+def invalidate_home_sliders(sender, instance, **kwargs):
+    invalidate_home_sections('sliders', 'promotions')
+
+
+@receiver([post_save, post_delete], sender=AcceptancePayment)
+def invalidate_home_promotions(sender, instance, **kwargs):
+    invalidate_home_sections('promotions')
+
+
+# =========================================================
+# SEARCH INDEX
+# =========================================================
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, raw=False, update_fields=None, **kwargs):
+    # saves that only touched e.g. stock or status leave the indexed text alone
+    if not raw and (update_fields is None or not update_fields.isdisjoint(FTS_COLUMNS)):
+        index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_search_index(sender, instance, **kwargs):
+    unindex_product(instance.pk)
+
+
+# =========================================================
+# AUTOCOMPLETE INDEX
+# =========================================================
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Product)
+def update_autocomplete_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous_version = get_catalog_version()
+    transaction.on_commit(lambda: apply_catalog_change(
+        sender._meta.model_name, instance, previous_version=previous_version))
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Product)
+def remove_autocomplete_index(sender, instance, **kwargs):
+    previous_version = get_catalog_version()
+    transaction.on_commit(lambda: apply_catalog_change(
+        sender._meta.model_name, instance, deleted=True, previous_version=previous_version))
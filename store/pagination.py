@@ -0,0 +1,126 @@
+from datetime import datetime
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.functional import cached_property
+from store.cache import catalog_key, cache_timeout
+
+CURSOR_SALT = 'store.pagination.cursor'
+COUNT_CACHE_TIMEOUT = 60 * 5
+
+
+def parse_page(value):
+    # a missing, non-numeric or non-positive ?page= means the first page
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+# =========================================================
+# CURSOR TOKENS
+# =========================================================
+def encode_cursor(ordering, value, pk, direction):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return signing.dumps([ordering, value, pk, direction], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, ordering):
+    # A tampered, stale or foreign (other sort) token just means "first page"
+    try:
+        cursor_ordering, value, pk, direction = signing.loads(token, salt=CURSOR_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if cursor_ordering != ordering or direction not in ('next', 'prev'):
+        return None
+    return value, pk, direction
+
+
+# =========================================================
+# CURSOR PAGINATOR
+# =========================================================
+class CursorPaginator:
+    """
+    Keyset pagination over ``ordering`` (a single field, optionally prefixed
+    with '-') with ``id`` as tie-breaker. Pages are fetched with a WHERE on
+    the last seen key instead of OFFSET, and the total is an approximate
+    count cached per catalog version.
+    """
+    def __init__(self, queryset, per_page, ordering, count_key=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering
+        self.descending = ordering.startswith('-')
+        self.field = ordering.lstrip('-')
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        if not self.count_key:
+            return self.queryset.count()
+        key = catalog_key('shop_count', self.count_key)
+        count = cache.get(key)
+        if count is None:
+            count = self.queryset.order_by().count()
+            cache.set(key, count, cache_timeout(COUNT_CACHE_TIMEOUT))
+        return count
+
+    def _order(self, reverse=False):
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+        return [f'{prefix}{self.field}', f'{prefix}id'], descending
+
+    def _after(self, value, pk, descending):
+        op = 'lt' if descending else 'gt'
+        value = self.queryset.model._meta.get_field(self.field).to_python(value)
+        return Q(**{f'{self.field}__{op}': value}) | Q(**{self.field: value, f'id__{op}': pk})
+
+    def page(self, token=None):
+        cursor = decode_cursor(token, self.ordering) if token else None
+        if cursor is None:
+            order, descending = self._order()
+            rows = list(self.queryset.order_by(*order)[:self.per_page + 1])
+            return CursorPage(self, rows[:self.per_page], has_next=len(rows) > self.per_page, has_previous=False)
+
+        value, pk, direction = cursor
+        order, descending = self._order(reverse=direction == 'prev')
+        rows = list(self.queryset.filter(self._after(value, pk, descending)).order_by(*order)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'prev':
+            rows.reverse()
+            return CursorPage(self, rows, has_next=True, has_previous=has_more)
+        return CursorPage(self, rows, has_next=has_more, has_previous=True)
+
+
+class CursorPage:
+    def __init__(self, paginator, object_list, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self._has_next = has_next and bool(object_list)
+        self._has_previous = has_previous and bool(object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def _cursor(self, obj, direction):
+        field = self.paginator.field
+        return encode_cursor(self.paginator.ordering, getattr(obj, field), obj.pk, direction)
+
+    @property
+    def next_cursor(self):
+        return self._cursor(self.object_list[-1], 'next') if self._has_next else None
+
+    @property
+    def previous_cursor(self):
+        return self._cursor(self.object_list[0], 'prev') if self._has_previous else None
@@ -0,0 +1,112 @@
+import re
+from django.db import connection
+
+# =========================================================
+# FULL-TEXT SEARCH (SQLite FTS5)
+# =========================================================
+# store_product_fts is an FTS5 table whose rowid is the product id. It is
+# created by migration 0005 and kept in sync by the Product signals in
+# store.models; `manage.py reindex_search` rebuilds it from scratch.
+FTS_TABLE = 'store_product_fts'
+FTS_COLUMNS = ('title', 'keyword', 'tag', 'short_des', 'description')
+# bm25 column weights, same order as FTS_COLUMNS
+FTS_WEIGHTS = (10.0, 4.0, 4.0, 2.0, 1.0)
+
+
+def fts_available(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def build_match_query(text):
+    # every word must match, the last one as a prefix ("lap" -> laptop)
+    terms = re.findall(r'\w+', (text or '').lower())
+    if not terms:
+        return ''
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+# ---------------------------------------------------------
+# INDEX MAINTENANCE
+# ---------------------------------------------------------
+def index_product(product):
+    if not fts_available():
+        return
+    values = [getattr(product, column) or '' for column in FTS_COLUMNS]
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) VALUES (%s, {', '.join(['%s'] * len(FTS_COLUMNS))})",
+            [product.pk, *values]
+        )
+
+
+def unindex_product(product_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+
+
+def reindex_products(product_ids=None, using=connection):
+    # Rebuild the whole index (or only the given products) in SQL
+    if not fts_available(using):
+        return 0
+    columns = ', '.join(FTS_COLUMNS)
+    indexed = 0
+    with using.cursor() as cursor:
+        if product_ids is None:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(f"INSERT INTO {FTS_TABLE} (rowid, {columns}) SELECT id, {columns} FROM store_product")
+            indexed = cursor.rowcount
+        else:
+            product_ids = list(product_ids)
+            for start in range(0, len(product_ids), 500):
+                chunk = product_ids[start:start + 500]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", chunk)
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE} (rowid, {columns}) "
+                    f"SELECT id, {columns} FROM store_product WHERE id IN ({placeholders})", chunk
+                )
+                indexed += cursor.rowcount
+    return indexed
+
+
+# ---------------------------------------------------------
+# QUERIES
+# ---------------------------------------------------------
+def search_product_ids(text, limit=12, offset=0):
+    """
+    Ids of active, in-stock products matching ``text``, best bm25 rank
+    first, plus the total number of matches.
+    """
+    match = build_match_query(text)
+    if not match:
+        return [], 0
+    if not fts_available():
+        return _search_product_ids_fallback(text, limit, offset)
+
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    where = (
+        f"FROM {FTS_TABLE} JOIN store_product ON store_product.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s AND store_product.status = 'active' AND store_product.available_stock > 0"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {FTS_TABLE}.rowid {where} ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s OFFSET %s",
+            [match, limit, offset]
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute(f"SELECT COUNT(*) {where}", [match])
+        count = cursor.fetchone()[0]
+    return ids, count
+
+
+def _search_product_ids_fallback(text, limit, offset):
+    # non-SQLite backends: plain substring match on the title
+    from store.models import Product
+    products = Product.objects.filter(title__icontains=text.strip(), status='active', available_stock__gt=0)
+    ids = list(products.order_by('id').values_list('id', flat=True)[offset:offset + limit])
+    return ids, products.count()
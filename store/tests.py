@@ -1,3 +1,486 @@
+import json
+import random
+import threading
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from store.models import Category, Brand, Product, ProductVariant, Size, ImageGallery, Review, assign_unique_slugs, generate_unique_slug
+from store import cache as store_cache
+from store.metrics import MetricsRegistry
+from store.search import search_product_ids, build_match_query
+from store.facets import FacetIndex
+from store.home import get_home_context
+from store.benchmark import run_benchmark, load_budgets, check_budgets
 
-# Create your tests here.
+User = get_user_model()
+
+
+# =========================================================
+# ENDPOINT BENCHMARK
+# =========================================================
+class EndpointBenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_catalog', products=300, users=50, brands=10, categories=[3, 2, 2],
+                     batch_size=100, stdout=StringIO())
+        cls.user = User.objects.order_by('id').first()
+
+    def setUp(self):
+        # catalog caches are process-wide; start from cold ones
+        cache.clear()
+
+    def test_endpoints_within_query_budget(self):
+        results = run_benchmark(self.user, iterations=2)
+        # timings on a test database say little, query counts are the contract
+        violations = check_budgets(results, load_budgets(), latency=False)
+        self.assertEqual(violations, [])
+        self.assertEqual(len(results), 11)
+        # the cache-miss builders are measured too
+        home = next(result for result in results if result.name == 'home')
+        self.assertGreater(home.cold_queries, home.queries)
+
+
+# =========================================================
+# PRODUCT DETAIL VARIANTS
+# =========================================================
+class ProductDetailVariantTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            category=Category.objects.create(title='Shirts'), brand=Brand.objects.create(title='Acme'),
+            title='Plain Shirt', variant='size', old_price=Decimal('100.00'), discount_percent=20, available_stock=10
+        )
+        cls.own_price = ProductVariant.objects.create(
+            product=cls.product, size=Size.objects.create(title='Large', code='L'), sku='PLAIN-L',
+            variant_price=Decimal('95.00'), available_stock=3
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def get_detail(self):
+        return self.client.get(reverse('product-detail', args=[self.product.slug, self.product.pk]))
+
+    def test_variant_without_own_price_shows_the_sale_price(self):
+        ProductVariant.objects.filter(pk=self.own_price.pk).update(variant_price=Decimal('0.00'))
+        response = self.get_detail()
+        self.assertContains(response, '<span id="product-price">80.00</span>', html=True)
+        self.assertNotContains(response, '$ <span id="product-price">0.00</span>')
+        self.assertEqual(response.context['variant']['final_price'], '80.00')
+
+    def test_variant_price_overrides_the_sale_price(self):
+        response = self.get_detail()
+        self.assertContains(response, '<span id="product-price">95.00</span>', html=True)
+        payload = self.client.post(reverse('get-variant-by-size'), {
+            'product_id': self.product.pk, 'size_id': self.own_price.size_id,
+        }).json()
+        self.assertEqual(payload['variant_price'], '95.00')
+
+
+class ProductDetailReviewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            category=Category.objects.create(title='Mugs'), brand=Brand.objects.create(title='Acme'),
+            title='Mug', old_price=Decimal('10.00'), available_stock=5
+        )
+        users = [User.objects.create_user(username=f'reviewer{n}', email=f'reviewer{n}@example.com', password='secret')
+                 for n in range(13)]
+        for n, user in enumerate(users):
+            Review.objects.create(product=cls.product, user=user, subject=f'Review {n}', comment='Fine',
+                                  rating=4, status='inactive' if n == 12 else 'active')
+
+    def get_detail(self, **params):
+        return self.client.get(reverse('product-detail', args=[self.product.slug, self.product.pk]), params)
+
+    def test_latest_active_reviews_a_page_at_a_time(self):
+        response = self.get_detail()
+        self.assertEqual([review.subject for review in response.context['reviews']],
+                         [f'Review {n}' for n in range(11, 1, -1)])
+        self.assertContains(response, '?reviews=2#review')
+        response = self.get_detail(reviews=2)
+        self.assertEqual([review.subject for review in response.context['reviews']], ['Review 1', 'Review 0'])
+        self.assertNotContains(response, '?reviews=3#review')
+        self.assertNotContains(response, 'Review 12')
+        self.assertEqual(len(self.get_detail(reviews='abc').context['reviews']), 10)
+
+
+# =========================================================
+# PRODUCT DIRTY FIELDS
+# =========================================================
+class ProductDirtyFieldTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            category=Category.objects.create(title='Mugs'), brand=Brand.objects.create(title='Acme'),
+            title='Mug', old_price=Decimal('10.00'), available_stock=5
+        )
+
+    def test_partial_refresh_keeps_unsaved_edits_dirty(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.title = 'Tall Mug'
+        Product.objects.filter(pk=product.pk).update(available_stock=7)
+        product.refresh_from_db(fields=['available_stock'])
+        self.assertEqual(product.get_dirty_fields(), {'title'})
+        product.save()
+        self.assertEqual(Product.objects.values_list('title', 'available_stock').get(pk=product.pk), ('Tall Mug', 7))
+
+    def test_loading_a_deferred_field_keeps_unsaved_edits_dirty(self):
+        product = Product.objects.defer('long_des').get(pk=self.product.pk)
+        product.title = 'Tall Mug'
+        self.assertEqual(product.long_des, 'N/A')
+        self.assertEqual(product.get_dirty_fields(), {'title'})
+
+
+# =========================================================
+# SLUGS
+# =========================================================
+class UniqueSlugTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Phones')
+        cls.brand = Brand.objects.create(title='Acme')
+
+    def build(self, *titles):
+        return [Product(category=self.category, brand=self.brand, title=title) for title in titles]
+
+    def test_duplicates_in_different_chunks_get_different_slugs(self):
+        products = assign_unique_slugs(self.build(*[f'Filler {n}' for n in range(199)], 'Same', 'Same'))
+        self.assertEqual([product.slug for product in products[-2:]], ['same', 'same-1'])
+
+    def test_numeric_title_suffix_is_not_a_counter(self):
+        Product.objects.bulk_create(assign_unique_slugs(self.build('iPhone', 'iPhone 15')))
+        self.assertEqual(generate_unique_slug(Product, 'iPhone'), 'iphone-1')
+        self.assertEqual(generate_unique_slug(Product, 'iPhone 15'), 'iphone-15-1')
+
+    def test_free_base_with_suffixed_rows_is_scanned(self):
+        Product.objects.bulk_create([Product(category=self.category, brand=self.brand, title='Old Same', slug='same-1')])
+        products = assign_unique_slugs(self.build('Same', 'Same', 'Same'))
+        self.assertEqual([product.slug for product in products], ['same', 'same-2', 'same-3'])
+        with self.assertNumQueries(1):
+            assign_unique_slugs(self.build(*[f'Other {n}' for n in range(150)]))
+
+
+# =========================================================
+# CACHE TIMEOUTS
+# =========================================================
+class CacheTimeoutTests(TestCase):
+    def test_process_local_cache_caps_every_timeout(self):
+        # the test settings have no REDIS_URL: LocMemCache
+        self.assertTrue(store_cache.PROCESS_LOCAL_CACHE)
+        max_age = store_cache.LOCAL_CACHE_MAX_AGE
+        self.assertEqual(store_cache.cache_timeout(None), max_age)
+        self.assertEqual(store_cache.cache_timeout(60 * 60 * 24), max_age)
+        self.assertEqual(store_cache.cache_timeout(max_age - 1), max_age - 1)
+
+    def test_shared_cache_keeps_full_timeouts(self):
+        with mock.patch.object(store_cache, 'PROCESS_LOCAL_CACHE', False):
+            self.assertIsNone(store_cache.cache_timeout(None))
+            self.assertEqual(store_cache.cache_timeout(60 * 60 * 24), 60 * 60 * 24)
+
+
+# =========================================================
+# METRICS
+# =========================================================
+class MetricsRegistryTests(TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.requests = self.registry.counter('requests_total', "Requests by view", ('view',))
+        self.duration = self.registry.histogram('duration_seconds', "Latency", buckets=(0.1, 1))
+
+    def test_thread_shards_are_summed(self):
+        def worker():
+            for _ in range(100):
+                self.requests.inc(view='home')
+            self.requests.inc(view='shop')
+
+        workers = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(len(self.requests._shards), 4)
+        self.assertEqual(self.requests.samples(), {('home',): 400, ('shop',): 4})
+
+    def test_render_text_format(self):
+        self.requests.inc(view='say "hi"')
+        self.requests.inc(2, view='home')
+        for value in (0.05, 0.5, 3):
+            self.duration.observe(value)
+        self.assertEqual(self.registry.render(), '\n'.join([
+            '# HELP requests_total Requests by view',
+            '# TYPE requests_total counter',
+            'requests_total{view="home"} 2',
+            'requests_total{view="say \\"hi\\""} 1',
+            '# HELP duration_seconds Latency',
+            '# TYPE duration_seconds histogram',
+            'duration_seconds_bucket{le="0.1"} 1',
+            'duration_seconds_bucket{le="1"} 2',
+            'duration_seconds_bucket{le="+Inf"} 3',
+            'duration_seconds_sum 3.55',
+            'duration_seconds_count 3',
+        ]) + '\n')
+
+    def test_endpoint_is_staff_only(self):
+        user = User.objects.create_user(username='staff', email='staff@example.com', password='secret')
+        self.client.force_login(user)
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        User.objects.filter(pk=user.pk).update(is_staff=True)
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('# TYPE http_requests_total counter', response.content.decode())
+
+
+# =========================================================
+# FULL-TEXT SEARCH
+# =========================================================
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Bags')
+        cls.brand = Brand.objects.create(title='Acme')
+        cls.title_match = cls.create('Leather Laptop Bag')
+        cls.description_match = cls.create('Messenger Bag', description='Fits a laptop up to 15 inches')
+        cls.others = [cls.create(f'Canvas Tote {n}', keyword='canvas') for n in range(13)]
+
+    @classmethod
+    def create(cls, title, **fields):
+        return Product.objects.create(category=cls.category, brand=cls.brand, title=title, available_stock=5, **fields)
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(search_product_ids('laptop'), ([self.title_match.pk, self.description_match.pk], 2))
+        # the last word is a prefix
+        self.assertEqual(search_product_ids('leather lap')[0], [self.title_match.pk])
+
+    def test_pages_and_count(self):
+        first, count = search_product_ids('canvas', limit=12)
+        second, _ = search_product_ids('canvas', limit=12, offset=12)
+        self.assertEqual((len(first), len(second), count), (12, 1, 13))
+        self.assertEqual(set(first + second), {product.pk for product in self.others})
+
+    def test_punctuation_and_operators_are_plain_words(self):
+        self.assertEqual(build_match_query('"'), '')
+        self.assertEqual(build_match_query('a*b OR'), '"a" "b" "or"*')
+        for text in ('"', 'a*b OR', 'bag" NEAR(', '-laptop ^bag', 'NOT'):
+            ids, count = search_product_ids(text)
+            self.assertEqual(len(ids), count)
+        self.assertEqual(search_product_ids('"laptop" AND')[1], 0)
+
+    def test_index_follows_save_and_delete(self):
+        product = Product.objects.get(pk=self.title_match.pk)
+        product.title = 'Leather Briefcase'
+        product.save()
+        self.assertEqual(search_product_ids('briefcase')[0], [product.pk])
+        self.assertEqual(search_product_ids('laptop')[0], [self.description_match.pk])
+        product.delete()
+        self.assertEqual(search_product_ids('briefcase'), ([], 0))
+
+    def test_inactive_and_sold_out_products_are_not_found(self):
+        Product.objects.filter(pk=self.title_match.pk).update(status='inactive')
+        Product.objects.filter(pk=self.description_match.pk).update(available_stock=0)
+        self.assertEqual(search_product_ids('laptop'), ([], 0))
+
+    def test_view_pages(self):
+        response = self.client.get(reverse('search'), {'q': 'canvas', 'page': 2})
+        self.assertEqual((response.context['count'], len(response.context['products'])), (13, 1))
+        for page in ('abc', '-3', ''):
+            response = self.client.get(reverse('search'), {'q': 'canvas', 'page': page})
+            self.assertEqual((response.status_code, response.context['page']), (200, 1))
+
+
+# =========================================================
+# FACET INDEX
+# =========================================================
+class FacetIndexTests(TestCase):
+    per_page = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_catalog', products=240, users=5, brands=6, categories=[3, 2, 2], variants=1,
+                     images=1, reviews=0, carts=0, orders=0, batch_size=100, stdout=StringIO())
+        ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+        # unlisted products, and runs of equal prices around the bucket edges
+        Product.objects.filter(id__in=ids[::7]).update(status='inactive')
+        Product.objects.filter(id__in=ids[3::11]).update(available_stock=0)
+        Product.objects.filter(id__in=ids[::5]).update(sale_price=Decimal('100.00'))
+
+    def orm_filter(self, category_ids=(), brand_ids=(), max_price=None):
+        products = Product.objects.filter(status='active', available_stock__gt=0)
+        if category_ids:
+            products = products.filter(category_id__in=Category.subtree_ids(category_ids))
+        if brand_ids:
+            products = products.filter(brand_id__in=brand_ids)
+        if max_price is not None:
+            products = products.filter(sale_price__lte=max_price)
+        return products.order_by('id')
+
+    def test_filters_counts_and_pages_match_the_orm(self):
+        index = FacetIndex.build()
+        rng = random.Random(7)
+        category_ids = list(Category.objects.values_list('id', flat=True))
+        brand_ids = list(Brand.objects.values_list('id', flat=True))
+        prices = sorted(set(Product.objects.values_list('sale_price', flat=True)))
+        for _ in range(200):
+            categories = rng.sample(category_ids, rng.randint(0, 2))
+            brands = rng.sample(brand_ids, rng.randint(0, 2))
+            max_price = rng.choice([None, Decimal('0.00'), *prices, prices[-1] + 1])
+            expected = list(self.orm_filter(categories, brands, max_price).values_list('id', flat=True))
+
+            mask = index.filter(categories, brands, max_price)
+            self.assertEqual(mask.bit_count(), len(expected))
+            for page in (1, 2, len(expected) // self.per_page + 1):
+                start = (page - 1) * self.per_page
+                self.assertEqual(index.page(mask, page, self.per_page), expected[start:start + self.per_page])
+
+            counts = index.facet_counts(categories, brands, max_price)
+            for category_id, count in counts['category'].items():
+                self.assertEqual(count, self.orm_filter([category_id], brands, max_price).count())
+            for brand_id, count in counts['brand'].items():
+                self.assertEqual(count, self.orm_filter(categories, [brand_id], max_price).count())
+            previous = Decimal('-1')
+            for bucket in counts['price']:
+                bucket_max = Decimal(bucket['max'])
+                self.assertEqual(bucket['count'], self.orm_filter(categories, brands, bucket_max)
+                                 .filter(sale_price__gt=previous).count())
+                previous = bucket_max
+
+    def test_view_parses_bad_pages_as_the_first(self):
+        for page in ('x', '0', ''):
+            response = self.client.post(reverse('get-filter-products'), {'page': page})
+            self.assertEqual((response.status_code, response.json()['page']), (200, 1))
+
+
+# =========================================================
+# CATEGORY TREE
+# =========================================================
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        self.root = Category.objects.create(title='Clothing')
+        self.child = Category.objects.create(title='Shirts', parent=self.root)
+        self.leaf = Category.objects.create(title='T-Shirts', parent=self.child)
+        self.other = Category.objects.create(title='Shoes')
+
+    def path(self, *categories):
+        return ''.join(f'{category.pk:08d}/' for category in categories)
+
+    def stored(self, category):
+        return Category.objects.values_list('path', 'depth').get(pk=category.pk)
+
+    def test_paths_on_create(self):
+        self.assertEqual(self.stored(self.root), (self.path(self.root), 0))
+        self.assertEqual(self.stored(self.leaf), (self.path(self.root, self.child, self.leaf), 2))
+        self.assertEqual(self.leaf.path, self.path(self.root, self.child, self.leaf))
+        self.assertEqual(set(self.root.get_descendants()), {self.child, self.leaf})
+
+    def test_moving_a_subtree_rewrites_descendants(self):
+        child = Category.objects.get(pk=self.child.pk)
+        child.parent = self.other
+        child.save()
+        self.assertEqual(self.stored(self.child), (self.path(self.other, self.child), 1))
+        self.assertEqual(self.stored(self.leaf), (self.path(self.other, self.child, self.leaf), 2))
+        # a root move, one level up
+        child.parent = None
+        child.save()
+        self.assertEqual(self.stored(self.leaf), (self.path(self.child, self.leaf), 1))
+
+    def test_cycles_are_rejected(self):
+        root = Category.objects.get(pk=self.root.pk)
+        for parent in (self.root, self.leaf):
+            root.parent = parent
+            with self.assertRaises(ValidationError):
+                root.save()
+        self.assertEqual(self.stored(self.root), (self.path(self.root), 0))
+
+    def test_stale_parent_cannot_create_a_cycle(self):
+        stale_other = Category.objects.get(pk=self.other.pk)
+        # another request moves Shoes under the leaf
+        other = Category.objects.get(pk=self.other.pk)
+        other.parent = self.leaf
+        other.save()
+        # stale_other.path still says it is a root
+        root = Category.objects.get(pk=self.root.pk)
+        root.parent = stale_other
+        with self.assertRaises(ValidationError):
+            root.save()
+        self.assertEqual(self.stored(self.other), (self.path(self.root, self.child, self.leaf, self.other), 3))
+
+    def test_stale_instances_move_with_stored_paths(self):
+        stale_child = Category.objects.get(pk=self.child.pk)
+        stale_other = Category.objects.get(pk=self.other.pk)
+        stale_leaf = Category.objects.get(pk=self.leaf.pk)
+        root = Category.objects.get(pk=self.root.pk)
+        root.parent = self.other
+        root.save()
+        # both instances predate the move of the root
+        stale_child.parent = stale_other
+        stale_child.save()
+        self.assertEqual(self.stored(self.leaf), (self.path(self.other, self.child, self.leaf), 2))
+        # an edit through a stale instance leaves the stored path alone
+        stale_leaf.title = 'Tees'
+        stale_leaf.save()
+        self.assertEqual(self.stored(self.leaf), (self.path(self.other, self.child, self.leaf), 2))
+
+    def test_subtree_ids(self):
+        self.assertEqual(set(Category.subtree_ids([self.root.pk])), {self.root.pk, self.child.pk, self.leaf.pk})
+        self.assertEqual(set(Category.subtree_ids([self.child.pk, self.other.pk])),
+                         {self.child.pk, self.leaf.pk, self.other.pk})
+        self.assertEqual(Category.subtree_ids([]), [])
+
+
+# =========================================================
+# COVER IMAGE
+# =========================================================
+class CoverImageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            category=Category.objects.create(title='Mugs'), brand=Brand.objects.create(title='Acme'),
+            title='Mug', old_price=Decimal('10.00'), available_stock=5, is_featured=True
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def featured_cover(self):
+        featured = get_home_context()['featured_products']
+        return next(product.cover_image.name for product in featured if product.pk == self.product.pk)
+
+    def test_cover_change_refreshes_cached_home_sections(self):
+        self.assertEqual(self.featured_cover(), 'defaults/default.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ImageGallery.objects.create(product=self.product, image='galleries/mug.jpg')
+        self.assertEqual(self.featured_cover(), 'galleries/mug.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        self.assertEqual(self.featured_cover(), 'defaults/default.jpg')
+
+    def test_unchanged_cover_keeps_the_catalog_version(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ImageGallery.objects.create(product=self.product, image='galleries/mug.jpg')
+        version = store_cache.get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            ImageGallery.objects.create(product=self.product, image='galleries/mug-2.jpg')
+        self.assertEqual(Product.objects.get(pk=self.product.pk).cover_image.name, 'galleries/mug.jpg')
+        self.assertEqual(store_cache.get_catalog_version(), version)
+
+
+# =========================================================
+# REQUEST TIMING
+# =========================================================
+class RequestTimingTests(TestCase):
+    def test_slow_requests_are_logged_with_their_timings(self):
+        with mock.patch('store.middleware.REQUEST_TIMING_SLOW_MS', 0), \
+                self.assertLogs('project.request_timing', 'INFO') as logs:
+            response = self.client.get(reverse('search'), {'q': 'mug'})
+        self.assertIn('db;dur=', response['Server-Timing'])
+        message, = logs.output
+        record = json.loads(message.split('request_timing ', 1)[1])
+        self.assertEqual((record['url_name'], record['status']), ('search', 200))
@@ -6,7 +6,10 @@ from store.views import(
     ShopView,
     GetFilterProductsView,
     GetVariantBySizeView,
-    GetVariantByColorView
+    GetVariantByColorView,
+    SearchView,
+    AutocompleteView,
+    MetricsView
 )
 urlpatterns = [
     path('', HomeView.as_view(), name='home'),
@@ -16,4 +19,7 @@ urlpatterns = [
     path('product-review/', ProductReviewView.as_view(), name='product-review'),
     path('shop/', ShopView.as_view(), name='shop'),
     path('get-filter-products/', GetFilterProductsView.as_view(), name='get-filter-products'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('autocomplete/', AutocompleteView.as_view(), name='autocomplete'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
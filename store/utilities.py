@@ -0,0 +1,32 @@
+from django.utils.functional import SimpleLazyObject, new_method_proxy
+
+
+# =========================================================
+# REQUEST SCOPED MEMO
+# =========================================================
+def memoize_on_request(request, name, builder):
+    # A request that renders several templates (e.g. grid + pagination in
+    # one XHR response) runs every context processor once per render.
+    memo = request.__dict__.setdefault('_context_memo', {})
+    if name not in memo:
+        memo[name] = builder()
+    return memo[name]
+
+
+# =========================================================
+# LAZY CONTEXT
+# =========================================================
+class LazyContextValue(SimpleLazyObject):
+    # number formatting in templates (localize, floatformat) needs these
+    __format__ = new_method_proxy(format)
+    __int__ = new_method_proxy(int)
+    __float__ = new_method_proxy(float)
+
+
+def lazy_context(request, name, builder, keys):
+    # Nothing is built until a template actually reads one of the keys,
+    # and then the whole payload is built once for the request.
+    def resolve(key):
+        return memoize_on_request(request, name, builder)[key]
+
+    return {key: LazyContextValue(lambda key=key: resolve(key)) for key in keys}
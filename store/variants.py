@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.db import transaction
+from store.cache import get_or_build
+
+# =========================================================
+# VARIANT MATRIX
+# =========================================================
+# Everything the detail page needs to switch variants client-side, built in
+# one query and cached per product. The dicts mirror the model attribute
+# names so templates written against ProductVariant objects render them as-is.
+VARIANT_MATRIX_TIMEOUT = 60 * 60 * 24
+# bumped when the cached matrix changes shape
+VARIANT_MATRIX_FORMAT = 2
+
+
+def variant_matrix_key(product_id):
+    return f'variant_matrix:{product_id}:v{VARIANT_MATRIX_FORMAT}'
+
+
+def _size(size):
+    return {'id': size.id, 'code': size.code, 'title': size.title} if size else None
+
+
+def _color(color):
+    return {'id': color.id, 'title': color.title, 'code': color.code} if color else None
+
+
+def build_variant_matrix(product_id):
+    from store.models import ProductVariant
+    variants = ProductVariant.objects.filter(product_id=product_id, status='active', available_stock__gt=0) \
+        .select_related('product', 'size', 'color', 'gallery_image').order_by('id')
+
+    matrix = {'variants': {}, 'order': [], 'sizes': [], 'size_colors': {}}
+    for variant in variants:
+        matrix['order'].append(variant.id)
+        matrix['variants'][variant.id] = {
+            'id': variant.id,
+            'title': variant.title or '',
+            'sku': variant.sku or '',
+            'variant_price': str(variant.variant_price),
+            # what the customer pays: 0.00 above means "the product's price"
+            'final_price': str(variant.final_price),
+            'available_stock': variant.available_stock,
+            'image_url': variant.image_url,
+            'size': _size(variant.size),
+            'color': _color(variant.color),
+        }
+        if variant.size:
+            if variant.size_id not in matrix['size_colors']:
+                matrix['sizes'].append(_size(variant.size))
+            matrix['size_colors'].setdefault(variant.size_id, []).append(variant.id)
+    return matrix
+
+
+def get_variant_matrix(product_id):
+    return get_or_build(variant_matrix_key(product_id), lambda: build_variant_matrix(product_id), VARIANT_MATRIX_TIMEOUT)
+
+
+def variant_json(matrix):
+    # JSON object keys are strings; json_script would convert them anyway
+    return {
+        'variants': {str(key): value for key, value in matrix['variants'].items()},
+        'order': matrix['order'],
+        'sizes': matrix['sizes'],
+        'size_colors': {str(key): value for key, value in matrix['size_colors'].items()},
+    }
+
+
+def invalidate_variant_matrix(*product_ids):
+    transaction.on_commit(lambda: cache.delete_many([variant_matrix_key(pk) for pk in product_ids]))
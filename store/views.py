@@ -3,18 +3,24 @@ from django.views import generic
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import never_cache
 from django.utils import timezone
-from django.db.models import Avg, Q
 from django.core.paginator import Paginator
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404, HttpResponse
+from django.core.exceptions import PermissionDenied
 from django.template.loader import render_to_string
 from account.mixing import LogoutRequiredMixin, LoginRequiredMixin
+from store.pagination import CursorPaginator, parse_page
+from store.facets import get_facet_index, parse_ids, parse_price
+from store.search import search_product_ids
+from store.autocomplete import get_autocomplete_index
+from store.home import get_home_context
+from store.variants import get_variant_matrix, variant_json
+from store.metrics import registry
 from store.models import (
     Category,
     Brand,
     Product,
     Size,
     Slider,
-    AcceptancePayment,
     ProductVariant,
     Review
 )
@@ -23,51 +29,22 @@ import logging
 logger = logging.getLogger('project')
 
 
+def products_in_order(product_ids):
+    # Listing cards for ids ranked elsewhere (facet index, search), in that order
+    products = Product.objects.filter(id__in=product_ids) \
+        .select_related('category','brand') \
+        .prefetch_related('variants') \
+        .in_bulk()
+    return [products[product_id] for product_id in product_ids if product_id in products]
+
+
 # =========================================================
 # HOME PAGE VIEW
 # =========================================================
 @method_decorator(never_cache, name='dispatch')
 class HomeView(generic.View):
     def get(self, request):
-        active_sliders = Slider.objects.filter(status='active')
-        sliders = active_sliders.filter(Q(slider_type='slider') | Q(slider_type='feature'))
-        feature_sliders = active_sliders.filter(slider_type='feature')[:4]
-        add_sliders = active_sliders.filter(slider_type='add')[:2]
-        promo_sliders = active_sliders.filter(slider_type='promotion')[:3]
-        acceptance_payments = AcceptancePayment.objects.filter(status='active')[:4]
-
-        top_deals = list(
-            Product.objects.filter(
-                status='active',
-                discount_percent__gt=0,
-                is_deadline=True,
-                deadline__gte=timezone.now(),
-                available_stock__gt=0
-            ).select_related('category', 'brand')
-             .prefetch_related('reviews', 'variants')
-             .annotate(avg_rate=Avg('reviews__rating', filter=Q(reviews__status='active')))
-             .order_by('-discount_percent', 'deadline')[:6]
-        )
-        first_top_deal = top_deals[0] if top_deals else None
-
-        featured_products = Product.objects.filter(
-            status='active',
-            is_featured=True,
-            available_stock__gt=0
-        ).select_related('category', 'brand').prefetch_related('reviews', 'variants') \
-         .annotate(avg_rate=Avg('reviews__rating', filter=Q(reviews__status='active')))[:5]
-
-        context = {
-            'sliders': sliders,
-            'feature_sliders': feature_sliders,
-            'add_sliders': add_sliders,
-            'promo_sliders': promo_sliders,
-            'acceptance_payments': acceptance_payments,
-            'top_deals': top_deals,
-            'first_top_deal': first_top_deal,
-            'featured_products': featured_products,
-        }
-        return render(request, 'store/home.html', context)
+        return render(request, 'store/home.html', get_home_context())
 
 
 # =========================================================
@@ -75,11 +52,11 @@ class HomeView(generic.View):
 # =========================================================
 @method_decorator(never_cache, name='dispatch')
 class ProductDetailView(generic.View):
+    reviews_per_page = 10
+
     def get(self, request, slug, id):
         product = get_object_or_404(
-            Product.objects.select_related('category', 'brand')
-            .prefetch_related('images', 'reviews', 'variants', 'variants__color', 'variants__size')
-            .annotate(avg_rate=Avg('reviews__rating', filter=Q(reviews__status='active'))),
+            Product.objects.select_related('category', 'brand').prefetch_related('images'),
             slug=slug,
             id=id,
             status='active',
@@ -88,96 +65,79 @@ class ProductDetailView(generic.View):
 
         # Related products
         related_products = Product.objects.select_related('category', 'brand')\
-            .prefetch_related('images', 'reviews', 'variants')\
-            .annotate(avg_rate=Avg('reviews__rating', filter=Q(reviews__status='active')))\
+            .prefetch_related('variants')\
             .filter(category=product.category, status='active', available_stock__gt=0)\
             .exclude(id=product.id)[:4]
 
+        # Latest active reviews, a page at a time; rating_count is their total
+        review_page = parse_page(request.GET.get('reviews'))
+        start = (review_page - 1) * self.reviews_per_page
+        reviews = Review.objects.filter(product=product, status='active').select_related('user') \
+            .order_by('-created_at', '-id')[start:start + self.reviews_per_page]
+
         context = {
             'product': product,
             'related_products': related_products,
+            'reviews': reviews,
+            'next_review_page': review_page + 1 if start + self.reviews_per_page < product.rating_count else None,
         }
 
-        # VARIANTS
-        if product.variant != 'none':
-            variants = list(
-                ProductVariant.objects.filter(
-                    product_id=product.id,
-                    status='active',
-                    available_stock__gt=0
-                ).select_related('size', 'color').order_by('id')
-            )
-
-            if variants:
-                default_variant = variants[0]
-
-                # Unique sizes
-                seen_sizes = set()
-                sizes = []
-                for v in variants:
-                    if v.size and v.size.id not in seen_sizes:
-                        sizes.append(v.size)
-                        seen_sizes.add(v.size.id)
-
-                # Size -> colors mapping
-                size_color_map = {}
-                for v in variants:
-                    if v.size:
-                        size_color_map.setdefault(v.size.id, []).append(v)
-
-                # Colors for default size
-                colors = size_color_map.get(default_variant.size.id, []) if default_variant.size else []
-
-                context.update({
-                    'sizes': sizes,
-                    'colors': colors,
-                    'variant': default_variant,
-                    'size_color_map': size_color_map,
-                })
-            else:
-                context.update({
-                    'sizes': [],
-                    'colors': [],
-                    'variant': None,
-                    'size_color_map': {},
-                })
+        # VARIANTS (cached matrix, also embedded as JSON for client-side switching)
+        matrix = get_variant_matrix(product.id) if product.variant != 'none' else None
+        if matrix and matrix['order']:
+            variants = matrix['variants']
+            default_variant = variants[matrix['order'][0]]
+            size_color_map = {
+                size_id: [variants[variant_id] for variant_id in variant_ids]
+                for size_id, variant_ids in matrix['size_colors'].items()
+            }
+            colors = size_color_map.get(default_variant['size']['id'], []) if default_variant['size'] else []
+            context.update({
+                'sizes': matrix['sizes'],
+                'colors': colors,
+                'variant': default_variant,
+                'size_color_map': size_color_map,
+                'variant_matrix': variant_json(matrix),
+            })
         else:
-            context.update({'sizes': [], 'colors': [], 'variant': None, 'size_color_map': {}})
+            context.update({'sizes': [], 'colors': [], 'variant': None, 'size_color_map': {}, 'variant_matrix': None})
 
         return render(request, 'store/product-detail.html', context)
 
 
+def variant_payload(variant):
+    return {
+        'variant_id': variant['id'] if variant else None,
+        'variant_price': variant['final_price'] if variant else '0',
+        'variant_image': (variant['image_url'] or '') if variant else '',
+        'available_stock': variant['available_stock'] if variant else 0,
+        'size': variant['size']['code'] if variant and variant['size'] else '',
+        'color': variant['color']['title'] if variant and variant['color'] else '',
+        'sku': variant['sku'] if variant else '',
+        'title': variant['title'] if variant else ''
+    }
+
+
 # =========================================================
 # AJAX: GET VARIANT BY SIZE
 # =========================================================
+# Fallbacks for clients without the embedded variant matrix; both read the
+# same cached matrix as ProductDetailView.
 @method_decorator(never_cache, name='dispatch')
 class GetVariantBySizeView(generic.View):
     def post(self, request):
-        product_id = request.POST.get('product_id')
-        size_id = request.POST.get('size_id')
+        product_id = request.POST.get('product_id', '')
+        size_id = request.POST.get('size_id', '')
+        if not product_id.isdigit() or not size_id.isdigit():
+            return JsonResponse({'rendered_colors': '', **variant_payload(None)})
 
-        variants = ProductVariant.objects.filter(
-            product_id=product_id,
-            size_id=size_id,
-            status='active',
-            available_stock__gt=0
-        ).select_related('size', 'color')
-
-        variant = variants.first() if variants.exists() else None
+        matrix = get_variant_matrix(int(product_id))
+        colors = [matrix['variants'][variant_id] for variant_id in matrix['size_colors'].get(int(size_id), [])]
+        variant = colors[0] if colors else None
 
-        html = render_to_string('store/color_options.html', {'colors': variants, 'variant': variant}, request=request)
+        html = render_to_string('store/color_options.html', {'colors': colors, 'variant': variant}, request=request)
 
-        return JsonResponse({
-            'rendered_colors': html,
-            'variant_id': variant.id if variant else None,
-            'variant_price': str(variant.variant_price) if variant else '0',
-            'variant_image': variant.image_url if variant else '',
-            'available_stock': variant.available_stock if variant else 0,
-            'size': variant.size.code if variant and variant.size else '',
-            'color': variant.color.title if variant and variant.color else '',
-            'sku': variant.sku if variant else '',
-            'title': variant.title if variant and variant.title else ''
-        })
+        return JsonResponse({'rendered_colors': html, **variant_payload(variant)})
 
 
 # =========================================================
@@ -186,25 +146,18 @@ class GetVariantBySizeView(generic.View):
 @method_decorator(never_cache, name='dispatch')
 class GetVariantByColorView(generic.View):
     def post(self, request):
-        variant_id = request.POST.get('variant_id')
+        variant_id = request.POST.get('variant_id', '')
+        product_id = request.POST.get('product_id', '')
+        if not variant_id.isdigit():
+            raise Http404
+        if not product_id.isdigit():
+            product_id = get_object_or_404(ProductVariant.objects.values_list('product_id', flat=True), id=variant_id)
 
-        variant = get_object_or_404(
-            ProductVariant.objects.select_related('size', 'color'),
-            id=variant_id,
-            status='active',
-            available_stock__gt=0
-        )
+        variant = get_variant_matrix(int(product_id))['variants'].get(int(variant_id))
+        if variant is None:
+            raise Http404
 
-        return JsonResponse({
-            'variant_id': variant.id,
-            'variant_price': str(variant.variant_price),
-            'available_stock': variant.available_stock,
-            'variant_image': variant.image_url,
-            'size': variant.size.code if variant.size else '',
-            'color': variant.color.title if variant.color else '',
-            'sku': variant.sku if variant.sku else '',
-            'title': variant.title if variant.title else ''
-        })
+        return JsonResponse(variant_payload(variant))
 
 
 # =========================================================
@@ -233,7 +186,8 @@ class ProductReviewView(LoginRequiredMixin, generic.View):
             return JsonResponse({'status': 'error', 'message': 'Already reviewed'}, status=400)
 
         review = Review.objects.create(user=user, product=product, rating=rating, subject=subject, comment=comment)
-        review_count = product.reviews.filter(status='active').count()
+        product.refresh_from_db(fields=['rating_count'])
+        review_count = product.rating_count
         image_url = user.image.url if hasattr(user, 'image') and user.image else '/media/defaults/default.jpg'
 
         review_html = f"""
@@ -265,34 +219,41 @@ class ProductReviewView(LoginRequiredMixin, generic.View):
 # =========================================================
 @method_decorator(never_cache, name='dispatch')
 class ShopView(generic.View):
+    # 'cursor' (keyset) or 'page' (numbered); ?page=N always uses numbered pages
+    pagination_mode = 'cursor'
+
     def get(self, request):
         per_page_options = [3,6,12]
         sort_options = ['latest','new','upcoming']
 
         products = Product.objects.filter(status='active', available_stock__gt=0) \
             .select_related('category','brand') \
-            .prefetch_related('reviews', 'variants') \
-            .annotate(avg_rate=Avg('reviews__rating', filter=Q(reviews__status='active')))
+            .prefetch_related('variants')
 
         banners = Slider.objects.filter(slider_type='add', status='active')[:1]
 
         per_page = int(request.GET.get('per_page') or 3)
         sort_by = request.GET.get('sort','latest')
-        page_number = int(request.GET.get('page') or 1)
+        if sort_by not in sort_options:
+            sort_by = 'latest'
 
         sort_map = {'latest':'-created_at','new':'created_at','upcoming':'deadline'}
         if sort_by == 'upcoming':
-            products = products.filter(deadline__gt=timezone.now()).order_by('deadline')
-        else:
-            products = products.order_by(sort_map.get(sort_by,'-created_at'))
+            products = products.filter(deadline__gt=timezone.now())
 
-        paginator = Paginator(products, per_page)
-        page_obj = paginator.get_page(page_number)
+        cursor_mode = self.pagination_mode == 'cursor' and not request.GET.get('page')
+        if cursor_mode:
+            paginator = CursorPaginator(products, per_page, sort_map[sort_by], count_key=sort_by)
+            page_obj = paginator.page(request.GET.get('cursor'))
+        else:
+            paginator = Paginator(products.order_by(sort_map[sort_by], 'id'), per_page)
+            page_obj = paginator.get_page(int(request.GET.get('page') or 1))
 
         context = {
             'products': page_obj,
             'banners': banners,
             'page_obj': page_obj,
+            'cursor_mode': cursor_mode,
             'per_page_options': per_page_options,
             'sort_options': sort_options,
             'selected_per_page': per_page,
@@ -300,11 +261,19 @@ class ShopView(generic.View):
         }
 
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            return JsonResponse({
+            data = {
                 'html': render_to_string('store/grid.html',context,request=request),
                 'pagination_html': render_to_string('store/pagination.html',context,request=request)
-            })
+            }
+            if cursor_mode:
+                data.update({
+                    'next_cursor': page_obj.next_cursor,
+                    'previous_cursor': page_obj.previous_cursor,
+                    'total_count': paginator.count,
+                })
+            return JsonResponse(data)
 
+        context['facets'] = get_facet_index().facet_counts()
         return render(request,'store/shop.html',context)
 
 
@@ -313,21 +282,86 @@ class ShopView(generic.View):
 # =========================================================
 @method_decorator(never_cache, name='dispatch')
 class GetFilterProductsView(generic.View):
-    def post(self, request):
-        products = Product.objects.filter(status='active', available_stock__gt=0) \
-            .select_related('category','brand') \
-            .prefetch_related('reviews', 'variants') \
-            .annotate(avg_rate=Avg('reviews__rating', filter=Q(reviews__status='active')))
+    per_page = 12
 
-        category_ids = request.POST.getlist('category[]')
-        if category_ids: products = products.filter(category_id__in=category_ids)
+    def post(self, request):
+        # Filtering and facet counts are answered by the in-memory facet
+        # index; the database is only asked for the cards on this page.
+        index = get_facet_index()
+        category_ids = parse_ids(request.POST.getlist('category[]'))
+        brand_ids = parse_ids(request.POST.getlist('brand[]'))
+        max_price = parse_price(request.POST.get('maxPrice'))
+        page_number = parse_page(request.POST.get('page'))
 
-        brand_ids = request.POST.getlist('brand[]')
-        if brand_ids: products = products.filter(brand_id__in=brand_ids)
+        mask = index.filter(category_ids, brand_ids, max_price)
+        count = mask.bit_count()
+        page_ids = index.page(mask, page_number, self.per_page)
 
-        max_price = request.POST.get('maxPrice')
-        if max_price: products = products.filter(sale_price__lte=max_price)
+        products = products_in_order(page_ids)
 
         html = render_to_string('store/grid.html', {'products': products}, request=request)
 
-        return JsonResponse({'html': html})
+        return JsonResponse({
+            'html': html,
+            'count': count,
+            'page': page_number,
+            'has_next': page_number * self.per_page < count,
+            'facets': index.facet_counts(category_ids, brand_ids, max_price),
+        })
+
+
+# =========================================================
+# PRODUCT SEARCH (PAGE + AJAX)
+# =========================================================
+@method_decorator(never_cache, name='dispatch')
+class SearchView(generic.View):
+    per_page = 12
+
+    def get(self, request):
+        query = request.GET.get('q', '').strip()
+        page_number = parse_page(request.GET.get('page'))
+
+        product_ids, count = search_product_ids(query, self.per_page, (page_number - 1) * self.per_page)
+        products = products_in_order(product_ids)
+
+        context = {
+            'products': products,
+            'query': query,
+            'count': count,
+            'page': page_number,
+            'has_previous': page_number > 1,
+            'has_next': page_number * self.per_page < count,
+        }
+
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            return JsonResponse({
+                'html': render_to_string('store/grid.html', context, request=request),
+                'count': count,
+                'page': page_number,
+                'has_next': context['has_next'],
+            })
+
+        return render(request, 'store/search.html', context)
+
+
+# =========================================================
+# AJAX: SEARCH AUTOCOMPLETE
+# =========================================================
+@method_decorator(never_cache, name='dispatch')
+class AutocompleteView(generic.View):
+    # Served from the in-process prefix index only, never from the database
+    def get(self, request):
+        index = get_autocomplete_index()
+        results = index.suggest(request.GET.get('q', '')) if index else []
+        return JsonResponse({'results': results})
+
+
+# =========================================================
+# METRICS (PROMETHEUS TEXT FORMAT, STAFF ONLY)
+# =========================================================
+@method_decorator(never_cache, name='dispatch')
+class MetricsView(generic.View):
+    def get(self, request):
+        if not request.user.is_staff:
+            raise PermissionDenied
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')